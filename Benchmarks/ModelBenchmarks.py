@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from textEditorModel import TextEditorModel
+from Location import Location
+from LocationRange import LocationRange
+
+#Headless benchmarks of the model layer. Every benchmark runs on a fresh model
+#of each document size, only the measured part is timed, and the results are
+#written as JSON that a later run can be compared against:
+#
+#   python Benchmarks/ModelBenchmarks.py --output results.json
+#   python Benchmarks/ModelBenchmarks.py --baseline results.json --sizes 1KB,1MB
+
+SIZES = {"1KB": 1 << 10, "100KB": 100 << 10, "1MB": 1 << 20, "10MB": 10 << 20, "100MB": 100 << 20}
+LINE_LENGTH = 200
+KEYS = 200
+
+def makeText(size):
+    line = ("lorem ipsum dolor sit amet " * (LINE_LENGTH // 27 + 1))[:LINE_LENGTH]
+    return "\n".join(line for _ in range(max(1, size // (LINE_LENGTH + 1))))
+
+def middle(model):
+    return len(model.lines) // 2
+
+def typeAt(column):
+    def run(model):
+        y = middle(model)
+        model.cursorLocation = Location(column(len(model.lines[y])), y)
+        for _ in range(KEYS):
+            model.insert("x")
+        return KEYS
+    return run
+
+def newlines(model):
+    model.cursorLocation = Location(LINE_LENGTH // 2, middle(model))
+    for _ in range(KEYS):
+        model.insert("\n")
+    return KEYS
+
+def backspaceJoins(model):
+    count = min(KEYS, len(model.lines) - 1)
+    y = max(1, middle(model))
+    for _ in range(count):
+        model.cursorLocation = Location(0, min(y, len(model.lines) - 1))
+        model.deleteBefore()
+    return count
+
+def paste(model):
+    block = "\n".join(model.lines.getLines(0, 1000))
+    model.cursorLocation = Location(0, middle(model))
+    for _ in range(5):
+        model.insertText(block)
+    return 5
+
+def deleteHalf(model):
+    quarter = len(model.lines) // 4
+    model.deleteRange(LocationRange(Location(3, quarter), Location(5, 3 * quarter)))
+    return 1
+
+def extendSelection(model):
+    model.cursorLocation = Location(0, 0)
+    for _ in range(KEYS):
+        model.selectionRangeDown()
+        model.selectionRangeRight()
+    return 2 * KEYS
+
+def getText(model):
+    model.getText()
+    return 1
+
+def getTextFromRange(model):
+    model.getTextFromRange(LocationRange(Location(3, len(model.lines) // 4), Location(5, 3 * len(model.lines) // 4)))
+    return 1
+
+def iterateLines(model):
+    count = 0
+    for _ in model.allLines():
+        count += 1
+    return count
+
+BENCHMARKS = {
+    "typing-start": typeAt(lambda length: 0),
+    "typing-middle": typeAt(lambda length: length // 2),
+    "typing-end": typeAt(lambda length: length),
+    "newline": newlines,
+    "backspace-join": backspaceJoins,
+    "paste": paste,
+    "delete-range": deleteHalf,
+    "selection": extendSelection,
+    "get-text": getText,
+    "get-text-from-range": getTextFromRange,
+    "iterate-lines": iterateLines,
+}
+
+def runSuite(sizes, names, repeat):
+    results = []
+    for sizeName in sizes:
+        text = makeText(SIZES[sizeName])
+        for name in names:
+            timings = []
+            for _ in range(repeat):
+                model = TextEditorModel(text)
+                start = time.perf_counter()
+                ops = BENCHMARKS[name](model)
+                timings.append((time.perf_counter() - start) / ops)
+            result = {"benchmark": name, "size": sizeName, "bytes": len(text), "ops": ops,
+                      "best": min(timings), "median": statistics.median(timings)}
+            results.append(result)
+            print("%-20s %6s %12.2f us/op" % (name, sizeName, result["median"] * 1e6), flush=True)
+    return results
+
+#returns the results that got slower than the baseline by more than the threshold
+def compare(results, baseline, threshold):
+    previous = {(result["benchmark"], result["size"]): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get((result["benchmark"], result["size"]))
+        if old is None:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] else 1.0
+        result["baseline"] = old["median"]
+        result["ratio"] = ratio
+        marker = "  REGRESSION" if ratio > threshold else ""
+        print("%-20s %6s %8.2fx%s" % (result["benchmark"], result["size"], ratio, marker))
+        if ratio > threshold:
+            regressions.append(result)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the text editor model")
+    parser.add_argument("--sizes", default="1KB,100KB,1MB,10MB,100MB", help="comma separated sizes out of " + ", ".join(SIZES))
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="comma separated benchmark names")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="file the JSON results are written to")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes.split(",")
+    names = args.only.split(",")
+    for value, known in [(size, SIZES) for size in sizes] + [(name, BENCHMARKS) for name in names]:
+        if value not in known:
+            parser.error("unknown size or benchmark: " + value)
+
+    results = runSuite(sizes, names, args.repeat)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+
+    if args.output:
+        report = {"python": platform.python_version(), "platform": platform.platform(),
+                  "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from textEditorModel import TextEditorModel
+
+#Measures how many Shift+arrow steps per second the model handles, which is
+#what holding Shift+Down through a large file costs without drawing.
+def run(lines=200000, steps=100000):
+    model = TextEditorModel("\n".join("line %d with some text" % i for i in range(lines)))
+    results = {}
+    for name, method in (("down", model.selectionRangeDown), ("right", model.selectionRangeRight),
+                         ("up", model.selectionRangeUp), ("left", model.selectionRangeLeft)):
+        start = time.perf_counter()
+        for _ in range(steps):
+            method()
+        results[name] = steps / (time.perf_counter() - start)
+    return results
+
+def main():
+    for name, rate in run().items():
+        print("selection %-5s %10.0f steps/s" % (name, rate))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from textEditorModel import TextEditorModel
+from ModelServer import ModelServer
+
+#Measures how fast a local client edits a model through the ModelServer:
+#
+#   python Benchmarks/ServerBenchmark.py --operations 100000 --tcp
+#
+#"pipelined" sends every insertText before reading any reply, which is how a
+#formatter would stream its edits, here words with a newline after every 20th.
+#"round trip" waits for each reply before sending the next request, so every
+#request waits for a frame. The number of text notifications a subscriber got
+#shows how many edits the model made.
+
+WORDS = ["word "] * 19 + ["\n"]
+
+async def request(reader, writer, requests):
+    writer.write("".join(json.dumps(message) + "\n" for message in requests).encode("utf-8"))
+    await writer.drain()
+    replies = []
+    while len(replies) < len(requests):
+        message = json.loads(await reader.readline())
+        if "id" in message:
+            replies.append(message)
+    return replies
+
+async def client(address, path, operations, roundTrips):
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path, limit=ModelServer.MAX_REQUEST)
+        subscriber = await asyncio.open_unix_connection(path)
+    else:
+        host, port = address.rsplit(":", 1)
+        reader, writer = await asyncio.open_connection(host, int(port), limit=ModelServer.MAX_REQUEST)
+        subscriber = await asyncio.open_connection(host, int(port))
+    await request(*subscriber, [{"id": 0, "op": "subscribe"}])
+    results = {}
+
+    start = time.perf_counter()
+    replies = await request(reader, writer, [{"id": i, "op": "insertText", "args": [WORDS[i % 20]]} for i in range(operations)])
+    elapsed = time.perf_counter() - start
+    assert all("error" not in reply for reply in replies)
+    results["pipelined insertText ops/s"] = operations / elapsed
+
+    latencies = []
+    for i in range(roundTrips):
+        start = time.perf_counter()
+        await request(reader, writer, [{"id": i, "op": "getCursor"}])
+        latencies.append(time.perf_counter() - start)
+    results["round trip median ms"] = statistics.median(latencies) * 1000
+
+    start = time.perf_counter()
+    text = (await request(reader, writer, [{"id": 0, "op": "getText"}]))[0]["result"]
+    results["getText MB/s"] = len(text) / (1024 * 1024) / (time.perf_counter() - start)
+
+    #the notifications were sent before the replies, the subscriber has them all by now
+    await asyncio.sleep(0.1)
+    notifications = 0
+    while True:
+        try:
+            line = await asyncio.wait_for(subscriber[0].readline(), 0.05)
+        except asyncio.TimeoutError:
+            break
+        if not line:
+            break
+        notifications += json.loads(line).get("event") == "text"
+    results["text notifications"] = notifications
+    for stream in (writer, subscriber[1]):
+        stream.close()
+    return results
+
+def run(lines=100000, operations=100000, roundTrips=50, fps=60, tcp=False):
+    model = TextEditorModel("\n".join("line %d with some text" % i for i in range(lines)))
+    server = ModelServer(model, path=None if tcp else ModelServer.defaultPath(), fps=fps)
+    address = server.start(drive=True)
+    try:
+        results = asyncio.run(client(address, server.path, operations, roundTrips))
+    finally:
+        server.stop()
+    assert model.lineCount() == lines + operations // 20
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the model server with a local client")
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--operations", type=int, default=100000)
+    parser.add_argument("--round-trips", type=int, default=50)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--tcp", action="store_true", help="connect over localhost instead of a Unix socket")
+    parser.add_argument("--json", help="also write the results to this file")
+    options = parser.parse_args()
+    results = run(options.lines, options.operations, options.round_trips, options.fps, options.tcp)
+    for name, value in results.items():
+        print("%-28s %12.1f" % (name, value))
+    if options.json:
+        with open(options.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
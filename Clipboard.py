@@ -1,31 +1,91 @@
+import os
+import tempfile
+import weakref
 from Observers import ClipboardObserver
+from MappedFile import MappedText
+
+#A clipboard entry too large to keep in memory. The text lives in a temporary
+#file until it is read, the file is removed with the entry or at exit.
+class SpilledText:
+    def __init__(self, text: str):
+        fd, self.path = tempfile.mkstemp(prefix="textEditorPy-clipboard-", suffix=".txt")
+        with open(fd, "w", encoding="utf-8", errors=MappedText.ERRORS, newline="") as file:
+            file.write(text)
+        self.size = len(text)
+        self.remover = weakref.finalize(self, removeFile, self.path)
+
+    def __len__(self):
+        return self.size
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8", errors=MappedText.ERRORS, newline="") as file:
+            return file.read()
+
+    def discard(self):
+        self.remover()
+
+def removeFile(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
 
 #2.7
+#Holds at most maxEntries texts of at most maxBytes characters together, the
+#oldest entries are evicted first. Texts longer than spillBytes are kept in
+#temporary files and read back when they are peeked or popped.
 class ClipboardStack:
-    def __init__(self):
+    def __init__(self, maxEntries=100, maxBytes=256 * 1024 * 1024, spillBytes=1024 * 1024):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.spillBytes = spillBytes
         self.texts = []
+        self.size = 0
         self.observers = []
 
     def push(self, text: str):
-        self.texts.append(text)
+        entry = SpilledText(text) if len(text) > self.spillBytes else text
+        self.texts.append(entry)
+        self.size += len(entry)
+        self.evict()
         self.notifyObservers()
 
+    def evict(self):
+        #the newest entry always stays, even when it is over the budget on its own
+        evicted = 0
+        while len(self.texts) > 1 and (len(self.texts) > self.maxEntries or self.size > self.maxBytes):
+            self.discard(self.texts.pop(0))
+            evicted += 1
+        if evicted:
+            for observer in self.observers:
+                observer.clipboardEvicted(evicted)
+
+    def discard(self, entry):
+        self.size -= len(entry)
+        if isinstance(entry, SpilledText):
+            entry.discard()
+
     def pop(self):
         if self.texts:
-            text = self.texts.pop()
+            entry = self.texts.pop()
+            text = entry.load() if isinstance(entry, SpilledText) else entry
+            self.discard(entry)
             self.notifyObservers()
             return text
         return None
 
     def peek(self):
         if self.texts:
-            return self.texts[-1]
+            entry = self.texts[-1]
+            return entry.load() if isinstance(entry, SpilledText) else entry
         return None
 
     def isEmpty(self):
         return len(self.texts) == 0
 
     def clear(self):
+        for entry in self.texts:
+            self.discard(entry)
         self.texts.clear()
         self.notifyObservers()
 
@@ -37,4 +97,4 @@ class ClipboardStack:
 
     def notifyObservers(self):
         for observer in self.observers:
-            observer.updateClipboard()
\ No newline at end of file
+            observer.updateClipboard()
@@ -0,0 +1,125 @@
+import os
+import sys
+from textEditorModel import TextEditorModel
+from Clipboard import ClipboardStack
+from PluginRegistry import PluginRegistry
+from EditJournal import EditJournal
+
+#An open document. Its model is only created when the document is first shown.
+#In the background it keeps its model but no canvas items or layout caches,
+#only the scroll position and saved version needed to show it again.
+class Document:
+    def __init__(self, path=None, text=""):
+        self.path = path
+        #text of a new document until its model is created
+        self.text = text
+        self.model = None
+        self.scrollOffset = 0
+        self.savedVersion = None
+        #number of journal entries applied when the model was created
+        self.recovered = 0
+
+    def getName(self):
+        return os.path.basename(self.path) if self.path else "Untitled"
+
+    def isLoaded(self):
+        return self.model is not None
+
+    def isModified(self):
+        return self.model is not None and self.model.version != self.savedVersion
+
+    def load(self, clipboard):
+        if self.model is None:
+            self.model = TextEditorModel(self.text if self.path is None else "", clipboard=clipboard)
+            if self.path is not None:
+                self.model.openFile(self.path)
+            self.text = None
+            self.savedVersion = self.model.version
+            if self.path is not None:
+                _, self.recovered = EditJournal.attach(self.model, self.path)
+        return self.model
+
+    #drops the model of an unmodified file, it is opened again when the document is shown
+    def unload(self):
+        if self.path is None or self.isModified():
+            return False
+        if self.model.journal is not None:
+            self.model.journal.close()
+        self.model.closeFile()
+        self.model = None
+        self.scrollOffset = 0
+        return True
+
+    #rough number of bytes the text and the undo history of the document take
+    def memoryUsage(self):
+        if self.model is None:
+            return sys.getsizeof(self.text) if self.text is not None else 0
+        return self.model.lines.memoryUsage() + self.model.undoManager.size
+
+#The documents open in the tabs of one editor. The plugins are discovered and
+#the clipboard is created once and shared by every document. When more than
+#maxLoaded documents have a model, the least recently shown unmodified files
+#among them are unloaded.
+class DocumentManager:
+    def __init__(self, registry=None, maxLoaded=16):
+        self.plugins = (registry or PluginRegistry()).discover()
+        self.clipboard = ClipboardStack()
+        self.maxLoaded = maxLoaded
+        self.documents = []
+        self.active = None
+        #loaded documents, the most recently shown last
+        self.recent = []
+
+    def new(self, text=""):
+        document = Document(text=text)
+        self.documents.append(document)
+        return document
+
+    def open(self, path):
+        #a file that is already open is not opened a second time
+        path = os.path.abspath(path)
+        for document in self.documents:
+            if document.path == path:
+                return document
+        document = Document(path)
+        self.documents.append(document)
+        return document
+
+    def activate(self, document):
+        model = document.load(self.clipboard)
+        self.active = document
+        if document in self.recent:
+            self.recent.remove(document)
+        self.recent.append(document)
+        self.releaseLoaded()
+        return model
+
+    def releaseLoaded(self):
+        for document in list(self.recent[:-1]):
+            if len(self.recent) <= self.maxLoaded:
+                break
+            if document.unload():
+                self.recent.remove(document)
+
+    def close(self, document):
+        #returns the document to show instead when the active one was closed
+        index = self.documents.index(document)
+        self.documents.remove(document)
+        if document in self.recent:
+            self.recent.remove(document)
+        #closing a document gives up its unsaved edits, so its journal goes too
+        if document.isLoaded() and document.model.journal is not None:
+            document.model.journal.discard()
+        if document.isLoaded():
+            document.model.closeFile()
+        document.model = None
+        if document is not self.active:
+            return None
+        self.active = None
+        if not self.documents:
+            self.new()
+        return self.documents[min(index, len(self.documents) - 1)]
+
+    #(document, bytes) of every document that is not shown
+    def memoryReport(self):
+        return [(document, document.memoryUsage()) for document in self.documents if document is not self.active]
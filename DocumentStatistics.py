@@ -0,0 +1,32 @@
+#Line, word and character counts of a TextEditorModel, kept up to date from
+#the lines each edit replaces. Words never span lines, so recounting the
+#replaced lines is enough to handle words split or joined at the edges.
+class DocumentStatistics:
+    def __init__(self, lines):
+        self.reset(lines)
+
+    def reset(self, lines):
+        self.lineCount = 0
+        self.words = 0
+        self.characters = 0
+        self.update([], lines)
+        self.ready = True
+
+    #used for mapped files, the counts are computed on the first request
+    def invalidate(self):
+        self.ready = False
+
+    def update(self, oldLines, newLines):
+        for line in oldLines:
+            self.words -= len(line.split())
+            self.characters -= len(line)
+        for line in newLines:
+            self.words += len(line.split())
+            self.characters += len(line)
+        self.lineCount += len(newLines) - len(oldLines)
+
+    def counts(self, lines):
+        #returns (lines, words, characters) the same way text.split() and len(text) count them
+        if not self.ready:
+            self.reset(lines)
+        return self.lineCount, self.words, self.characters + self.lineCount - 1
@@ -0,0 +1,237 @@
+import json
+import os
+import tempfile
+import time
+from Location import Location
+from MappedFile import MappedText
+
+#Append-only journal of the edits made to the model of a file, so that work
+#which was never saved survives a crash. The first line is a header naming
+#the checkpoint the edits apply to. That is either the file as it was last
+#saved, identified by its size and mtime, or the text of a ["s", text] entry
+#that follows the header. Every other line is one JSON entry:
+#
+#   ["r", y, x, endY, endX, text]   the range was replaced by text
+#   ["s", text]                     the whole text was replaced
+#
+#Entries are buffered and written at most every syncInterval seconds, followed
+#by an fsync. Typing and backspacing at one place are merged into one entry
+#before they are written. When the journal grows past maxBytes it is
+#rewritten as a checkpoint of the current text.
+class EditJournal:
+    FORMAT = 1
+
+    def __init__(self, path, model, syncInterval=1.0, maxBytes=64 * 1024 * 1024):
+        self.path = path
+        self.model = model
+        self.syncInterval = syncInterval
+        self.maxBytes = maxBytes
+        self.buffer = []
+        self.file = None
+        self.size = 0
+        self.lastSync = time.monotonic()
+        #entries written since the last checkpoint
+        self.entries = 0
+        #entries written before the snapshot of a running save, None when no save is running
+        self.saveMark = None
+
+    #where the journal of a file is kept, next to the file
+    @staticmethod
+    def pathFor(path):
+        path = os.path.abspath(path)
+        return os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".journal")
+
+    @staticmethod
+    def fingerprint(path):
+        stat = os.stat(path)
+        return {"file": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    #Starts journaling the edits of a model that has just opened the file at path.
+    #A journal left behind by an earlier session is replayed first when its checkpoint
+    #is still the file on disk, otherwise, or when it cannot be read, it is moved aside
+    #to <journal>.stale. Returns the journal and the number of entries replayed, the
+    #journal is None when it cannot be written next to the file.
+    @classmethod
+    def attach(cls, model, path, **options):
+        journal = cls(cls.pathFor(path), model, **options)
+        replayed = 0
+        try:
+            recovered = journal.recover(path) if os.path.exists(journal.path) else None
+            if recovered is None and os.path.exists(journal.path):
+                os.replace(journal.path, journal.path + ".stale")
+            if recovered and recovered[1]:
+                #written again without the line a crash may have cut short, new entries must not follow it
+                journal.rewrite(*recovered)
+                replayed = len(recovered[1])
+            else:
+                journal.rewrite(cls.fingerprint(path), [])
+        except OSError:
+            return None, replayed
+        model.journal = journal
+        return journal, replayed
+
+    def recover(self, path):
+        #returns the checkpoint and the entries applied, None when the journal belongs to
+        #another checkpoint or cannot be read
+        with open(self.path, "r", encoding="utf-8", errors=MappedText.ERRORS) as file:
+            try:
+                header = json.loads(file.readline())
+                if header.get("format") != self.FORMAT:
+                    return None
+                if "file" in header and header != dict(self.fingerprint(path), format=self.FORMAT):
+                    return None
+                entries = self.read(file)
+                self.replay(self.model, entries)
+            except (ValueError, TypeError, IndexError, KeyError, AttributeError):
+                return None
+        del header["format"]
+        return header, entries
+
+    @staticmethod
+    def read(file):
+        entries = []
+        for line in file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                #the last line is cut short when the editor crashed while writing it
+                break
+        return entries
+
+    #Applies journal entries to the model as one edit without an undo step. The entries
+    #are applied to a plain list of lines and the model gets the result at once, so a
+    #million entries cost a million string splices, not a million model edits. Raises
+    #ValueError or TypeError for an entry that does not fit the text, before the model
+    #is changed.
+    @staticmethod
+    def replay(model, entries):
+        #entries may refer to any line, so the whole file has to be indexed first
+        model.finishLoading()
+        lines = list(model.lines)
+        count = 0
+        for entry in entries:
+            if entry[0] == "r":
+                _, y, x, endY, endX, text = entry
+                if not isinstance(text, str) or not 0 <= y <= endY < len(lines) or x < 0 or endX < 0:
+                    raise ValueError(f"journal entry {entry} does not fit the text")
+                if y == endY and "\n" not in text:
+                    line = lines[y]
+                    lines[y] = line[:x] + text + line[endX:]
+                else:
+                    new = text.split("\n")
+                    new[0] = lines[y][:x] + new[0]
+                    new[-1] += lines[endY][endX:]
+                    lines[y:endY + 1] = new
+            elif entry[0] == "s":
+                lines = entry[1].split("\n")
+            else:
+                raise ValueError(f"unknown journal entry {entry}")
+            count += 1
+        if count:
+            model.undoManager.recording = False
+            try:
+                with model.edit():
+                    model.setText("\n".join(lines))
+                    model.cursorLocation = Location(0, 0)
+                    model.notifyCursorObservers()
+            finally:
+                model.undoManager.recording = True
+        return count
+
+    def recordRange(self, start, end, text):
+        last = self.buffer[-1] if self.buffer else None
+        if last is not None and last[0] == "r":
+            #typing right after the text just inserted
+            if start == end and last[1:3] == last[3:5] and "\n" not in last[5] and "\n" not in text \
+                    and (start.y, start.x) == (last[1], last[2] + len(last[5])):
+                last[5] += text
+                self.recorded()
+                return
+            #backspacing in front of the text just deleted
+            if not text and not last[5] and (end.y, end.x) == (last[1], last[2]):
+                last[1:3] = [start.y, start.x]
+                self.recorded()
+                return
+        self.buffer.append(["r", start.y, start.x, end.y, end.x, text])
+        self.recorded()
+
+    def recordText(self, text):
+        #earlier entries in the buffer no longer matter
+        self.buffer = [["s", text]]
+        self.recorded()
+
+    def recorded(self):
+        if time.monotonic() - self.lastSync >= self.syncInterval:
+            self.sync()
+
+    #writes the buffered entries and makes them durable, the editor calls this on a timer as well
+    def sync(self):
+        self.lastSync = time.monotonic()
+        if not self.buffer or self.file is None:
+            return
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in self.buffer)
+        self.entries += len(self.buffer)
+        self.buffer = []
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.size += len(data)
+        if self.size > self.maxBytes:
+            self.compact()
+
+    def compact(self):
+        #the text itself is the new checkpoint
+        self.rewrite({}, [["s", self.model.getText()]])
+
+    def rewrite(self, checkpoint, entries):
+        #replaces the journal atomically, a crash leaves either the old or the new one
+        if self.file is not None:
+            self.file.close()
+        directory = os.path.dirname(self.path)
+        fd, tempPath = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + ".", suffix=".tmp")
+        with open(fd, "w", encoding="utf-8", errors=MappedText.ERRORS) as file:
+            file.write(json.dumps(dict(checkpoint, format=self.FORMAT)) + "\n")
+            for entry in entries:
+                file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tempPath, self.path)
+        self.file = open(self.path, "a", encoding="utf-8", errors=MappedText.ERRORS)
+        self.size = self.file.tell()
+        self.entries = len(entries)
+        self.buffer = []
+        #a save that is still running no longer knows which entries follow its snapshot
+        self.saveMark = None
+
+    #call when a save of the model takes its snapshot
+    def beginSave(self):
+        self.sync()
+        self.saveMark = self.entries
+
+    #call when that save finished, path is the saved file or None when it failed
+    def endSave(self, path):
+        mark, self.saveMark = self.saveMark, None
+        #a journal closed while the file was being written is not written again
+        if path is None or mark is None or self.file is None:
+            return
+        #only the edits made while the file was being written remain
+        self.sync()
+        with open(self.path, "r", encoding="utf-8", errors=MappedText.ERRORS) as file:
+            lines = file.readlines()[1 + mark:]
+        self.rewrite(self.fingerprint(path), [json.loads(line) for line in lines])
+
+    #writes what is buffered, a journal without entries is not needed any more
+    def close(self):
+        self.sync()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.entries == 0 and os.path.exists(self.path):
+            os.remove(self.path)
+
+    #closes the journal and deletes it together with the edits it holds
+    def discard(self):
+        self.buffer = []
+        self.entries = 0
+        self.saveMark = None
+        self.close()
@@ -0,0 +1,113 @@
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from Observers import SaveObserver
+from MappedFile import MappedText
+
+#Writes a snapshot of the model to a file on a worker thread. The text is
+#streamed into a temporary file next to the target, fsynced and renamed over
+#the target, so a crash never leaves a half written file behind.
+#Observers are notified from poll(), on the thread that calls it.
+class FileSaver:
+    def __init__(self, model, path, chunkLines=4096):
+        self.path = path
+        self.chunkLines = chunkLines
+        #lines of a file that is still loading would be missing from the snapshot
+        model.finishLoading()
+        self.blocks = model.lines.snapshot()
+        #the snapshot may read lines from the opened file, it stays open until the save is done
+        self.mapped = model.mapped
+        if self.mapped is not None:
+            self.mapped.retain()
+        self.total = len(model.lines)
+        self.version = model.version
+        self.newline = model.newline
+        self.events = queue.Queue()
+        self.observers = []
+        self.thread = None
+        self.done = False
+
+    def addObserver(self, observer: SaveObserver):
+        self.observers.append(observer)
+
+    def removeObserver(self, observer: SaveObserver):
+        self.observers.remove(observer)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tempPath = None
+        error = None
+        try:
+            fd, tempPath = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(self.path) + ".", suffix=".tmp")
+            #every \n written becomes the line ending of the file
+            with open(fd, "w", encoding="utf-8", errors=MappedText.ERRORS, newline=self.newline) as file:
+                written = 0
+                chunk = []
+                for block in self.blocks:
+                    for line in block:
+                        chunk.append(line)
+                        if len(chunk) == self.chunkLines:
+                            written = self.writeChunk(file, chunk, written)
+                            chunk = []
+                #an empty last chunk would add a newline, unless the document is empty
+                if chunk or written == 0:
+                    self.writeChunk(file, chunk, written)
+                file.flush()
+                os.fsync(file.fileno())
+            if os.path.exists(self.path):
+                shutil.copymode(self.path, tempPath)
+            os.replace(tempPath, self.path)
+            tempPath = None
+            self.syncDirectory(directory)
+        except Exception as failure:
+            #every failure has to finish the save, e.g. text that cannot be encoded raises UnicodeEncodeError
+            error = failure
+        finally:
+            if tempPath is not None and os.path.exists(tempPath):
+                os.remove(tempPath)
+            if self.mapped is not None:
+                self.mapped.release()
+                self.mapped = None
+            self.events.put(("finished", error))
+
+    def writeChunk(self, file, chunk, written):
+        if written > 0:
+            file.write("\n")
+        file.write("\n".join(chunk))
+        written += len(chunk)
+        self.events.put(("progress", written))
+        return written
+
+    def syncDirectory(self, directory):
+        #makes the rename itself durable, not supported on every platform
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    #delivers the queued events to the observers, returns True while saving
+    def poll(self):
+        while True:
+            try:
+                kind, value = self.events.get_nowait()
+            except queue.Empty:
+                return not self.done
+            if kind == "progress":
+                for observer in self.observers:
+                    observer.saveProgress(value, self.total)
+            else:
+                self.done = True
+                for observer in self.observers:
+                    observer.saveFinished(self.path, value)
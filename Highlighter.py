@@ -0,0 +1,173 @@
+import os
+import re
+import time
+from Observers import TextObserver
+
+#colors of the token kinds, kinds without a color are drawn like plain text
+TOKEN_COLORS = {"keyword": "#0000c0", "constant": "#8000a0", "string": "#008000", "comment": "#808080",
+                "number": "#c05000", "decorator": "#a06000", "definition": "#006080",
+                "timestamp": "#006080", "error": "#d00000", "warning": "#c07000", "info": "#0000c0", "debug": "#808080"}
+
+#A tokenizer splits one line into (start, end, kind) tokens. Lines are tokenized
+#in order: each call gets the state the line above ended in and returns the
+#tokens together with the state this line ends in, e.g. inside a multi-line
+#string. States are compared with ==, so they should be plain values.
+class Tokenizer:
+    def initialState(self):
+        return None
+
+    def tokenizeLine(self, line, state):
+        return [], state
+
+#Tokenizer driven by regular expressions. RULES maps every state to a list of
+#(pattern, kind, next state) and the first rule that matches at the earliest
+#position wins. Patterns must not contain capturing groups and a kind of None
+#switches the state without producing a token.
+class RegexTokenizer(Tokenizer):
+    INITIAL = "default"
+    RULES = {}
+
+    def __init__(self):
+        self.patterns = {}
+        for state, rules in self.RULES.items():
+            pattern = re.compile("|".join(f"({rule})" for rule, _, _ in rules))
+            self.patterns[state] = (pattern, [(kind, nextState) for _, kind, nextState in rules])
+
+    def initialState(self):
+        return self.INITIAL
+
+    def tokenizeLine(self, line, state):
+        tokens = []
+        position = 0
+        while position < len(line):
+            pattern, actions = self.patterns[state]
+            match = pattern.search(line, position)
+            if match is None or match.end() == match.start():
+                break
+            kind, state = actions[match.lastindex - 1]
+            if kind is not None:
+                tokens.append((match.start(), match.end(), kind))
+            position = match.end()
+        return tokens, state
+
+class PythonTokenizer(RegexTokenizer):
+    KEYWORDS = ("and", "as", "assert", "async", "await", "break", "class", "continue", "def", "del", "elif", "else",
+                "except", "finally", "for", "from", "global", "if", "import", "in", "is", "lambda", "nonlocal",
+                "not", "or", "pass", "raise", "return", "try", "while", "with", "yield")
+    PREFIX = "[rRbBfFuU]{0,2}"
+    RULES = {
+        "default": [
+            (r"#.*", "comment", "default"),
+            (PREFIX + '"""', "string", '"""'),
+            (PREFIX + "'''", "string", "'''"),
+            (PREFIX + r'"(?:[^"\\]|\\.)*"?', "string", "default"),
+            (PREFIX + r"'(?:[^'\\]|\\.)*'?", "string", "default"),
+            (r"(?<=\bdef )\w+|(?<=\bclass )\w+", "definition", "default"),
+            (r"\b(?:%s)\b" % "|".join(KEYWORDS), "keyword", "default"),
+            (r"\b(?:True|False|None|self)\b", "constant", "default"),
+            (r"\b(?:0[xXoObB][0-9a-fA-F_]+|\d[\d_]*\.?\d*(?:[eE][+-]?\d+)?j?)\b", "number", "default"),
+            (r"@\w+(?:\.\w+)*", "decorator", "default"),
+        ],
+        #inside triple quoted strings, which may span lines
+        '"""': [(r'.*?"""', "string", "default"), (r".+", "string", '"""')],
+        "'''": [(r".*?'''", "string", "default"), (r".+", "string", "'''")],
+    }
+
+class LogTokenizer(RegexTokenizer):
+    RULES = {
+        "default": [
+            (r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?", "timestamp", "default"),
+            (r"\b(?:ERROR|FATAL|CRITICAL|SEVERE|Traceback)\b", "error", "default"),
+            (r"\b(?:WARN|WARNING)\b", "warning", "default"),
+            (r"\b(?:INFO|NOTICE)\b", "info", "default"),
+            (r"\b(?:DEBUG|TRACE)\b", "debug", "default"),
+            (r'"(?:[^"\\]|\\.)*"', "string", "default"),
+            (r"\b\d+(?:\.\d+)*\b", "number", "default"),
+        ],
+    }
+
+#tokenizers picked by the extension of the opened file
+TOKENIZERS = {".py": PythonTokenizer, ".pyw": PythonTokenizer, ".log": LogTokenizer}
+
+def tokenizerFor(path):
+    tokenizer = TOKENIZERS.get(os.path.splitext(path)[1].lower())
+    return tokenizer() if tokenizer is not None else None
+
+#Tokens of the lines of a model, cached per line together with the states the
+#line starts and ends in. Edits drop the entries of the changed lines and move
+#the frontier, the first line that may be wrong, back to them. advance
+#tokenizes forward from the frontier and stops re-tokenizing as soon as a line
+#below the edited ones starts in the same state as before, so typing usually
+#re-tokenizes one line. Lines are only tokenized when the editor asks for them.
+class Highlighter(TextObserver):
+    def __init__(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.reset()
+        model.addTextObserver(self)
+
+    def detach(self):
+        self.model.removeTextObserver(self)
+
+    def reset(self):
+        #(start state, tokens, end state) of each line, None when it has to be tokenized
+        self.entries = [None] * len(self.model.lines)
+        #lines above the frontier are valid
+        self.frontier = 0
+        #no line from here on has an entry
+        self.tokenizedEnd = 0
+        #lines from here on kept their entries through the edits since the states last converged
+        self.dirtyEnd = 0
+
+    def updateText(self, changes=None):
+        if changes is None:
+            self.reset()
+            return
+        for change in changes:
+            start, end = change.start, change.start + change.removed
+            delta = change.inserted - change.removed
+            self.entries[start:end] = [None] * change.inserted
+            self.frontier = min(self.frontier, start)
+            self.tokenizedEnd = self.shift(self.tokenizedEnd, start, end, delta)
+            self.dirtyEnd = max(self.shift(self.dirtyEnd, start, end, delta), start + change.inserted)
+
+    @staticmethod
+    def shift(line, start, end, delta):
+        #where a boundary between lines ends up after lines [start, end) were replaced
+        return line + delta if line >= end else min(line, start)
+
+    def tokensAt(self, line):
+        #tokens of a line, or None while the line is not tokenized yet
+        return self.entries[line][1] if line < self.frontier else None
+
+    def advance(self, limit, deadline=None):
+        #tokenizes until the frontier reaches limit or perf_counter passes the deadline,
+        #returns the range of lines that were tokenized or None
+        limit = min(limit, len(self.entries))
+        line = self.frontier
+        first = last = None
+        while line < limit:
+            state = self.entries[line - 1][2] if line > 0 else self.tokenizer.initialState()
+            entry = self.entries[line]
+            if entry is not None and entry[0] == state:
+                if line >= self.dirtyEnd:
+                    #the states converged, every entry up to tokenizedEnd is valid again
+                    line = max(line + 1, self.tokenizedEnd)
+                    self.dirtyEnd = 0
+                else:
+                    line += 1
+                continue
+            tokens, endState = self.tokenizer.tokenizeLine(self.model.lines[line], state)
+            self.entries[line] = (state, tokens, endState)
+            if first is None:
+                first = line
+            line += 1
+            last = line
+            self.tokenizedEnd = max(self.tokenizedEnd, line)
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+        #the entry below a frontier that stopped early may not start in the state above it
+        if line < self.tokenizedEnd:
+            self.dirtyEnd = max(self.dirtyEnd, line + 1)
+        self.frontier = line
+        return (first, last) if first is not None else None
@@ -0,0 +1,149 @@
+import json
+import math
+import time
+from functools import wraps
+
+#Histogram with logarithmic buckets, each about 9% wider than the one before.
+#Percentiles are the upper edge of the bucket they fall in, so they are
+#accurate to a bucket width whatever the number of samples.
+class Histogram:
+    GROWTH = 2 ** 0.125
+
+    def __init__(self, smallest):
+        self.smallest = smallest
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        bucket = 0 if value <= self.smallest else int(math.log(value / self.smallest, self.GROWTH)) + 1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def upper(self, bucket):
+        return self.smallest * self.GROWTH ** bucket
+
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        rank = p / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.upper(bucket), self.max)
+        return self.max
+
+    def toDict(self):
+        return {"count": self.count, "total": self.total, "max": self.max,
+                "p50": self.percentile(50), "p90": self.percentile(90), "p99": self.percentile(99),
+                "buckets": {"%.9g" % self.upper(bucket): count for bucket, count in sorted(self.buckets.items())}}
+
+#Optional timing of a model and its editor. Attaching replaces the listed
+#methods of the two objects with timed wrappers on the instances themselves
+#and detaching deletes the wrappers again, so nothing is measured and nothing
+#costs anything while the instrumentation is not attached.
+#
+#Timings are kept in seconds under "model.<method>" and "view.<method>",
+#"observers.<kind>" counts how many observers one notification reached,
+#"canvas.items" the items on the canvas after a paint and "keystroke" the time
+#from a key press until the canvas has been painted.
+class Instrumentation:
+    MODEL_OPERATIONS = ("insert", "insertText", "deleteBefore", "deleteAfter", "deleteRange",
+                        "moveCursorLeft", "moveCursorRight", "moveCursorUp", "moveCursorDown",
+                        "selectionRangeLeft", "selectionRangeRight", "selectionRangeUp", "selectionRangeDown",
+                        "copySelection", "cutSelection", "paste", "pasteAndRemove", "undo", "redo",
+                        "setText", "clear", "applyReplacements", "editAtCursors")
+    OBSERVER_LISTS = {"notifyTextObservers": "textObservers", "notifyCursorObservers": "cursorObservers",
+                      "notifySelectionObservers": "selectionObservers"}
+    VIEW_OPERATIONS = ("show", "drawCursor", "updateText", "redraw", "renderFrame")
+
+    def __init__(self):
+        self.histograms = {}
+        self.wrapped = []
+        self.editor = None
+        self.keyStart = None
+
+    def histogram(self, name, smallest=1e-6):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(smallest)
+        return self.histograms[name]
+
+    def attach(self, model, editor=None):
+        for name in self.MODEL_OPERATIONS:
+            self.wrap(model, name, self.timed("model." + name, getattr(model, name)))
+        for name, observers in self.OBSERVER_LISTS.items():
+            self.wrap(model, name, self.dispatch(model, name, observers, getattr(model, name)))
+        if editor is not None:
+            self.editor = editor
+            for name in self.VIEW_OPERATIONS:
+                self.wrap(editor, name, self.timed("view." + name, getattr(editor, name)))
+            #a bind tag in front of the editor's own sees every key before its handler runs
+            editor.bind_class("instrumentation", "<KeyPress>", self.keyPressed)
+            editor.bindtags(("instrumentation",) + editor.bindtags())
+
+    def detach(self):
+        for obj, name in self.wrapped:
+            delattr(obj, name)
+        self.wrapped = []
+        if self.editor is not None:
+            self.editor.bindtags(tuple(tag for tag in self.editor.bindtags() if tag != "instrumentation"))
+            self.editor = None
+
+    def wrap(self, obj, name, wrapper):
+        setattr(obj, name, wrapper)
+        self.wrapped.append((obj, name))
+
+    def timed(self, name, method):
+        histogram = self.histogram(name)
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.add(time.perf_counter() - start)
+        return wrapper
+
+    def dispatch(self, model, name, observers, method):
+        histogram = self.histogram("model." + name)
+        fanOut = self.histogram("observers." + observers, smallest=1)
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            #inside an edit the notification is only deferred, it reaches no observer yet
+            if model.editDepth > 0:
+                return method(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.add(time.perf_counter() - start)
+                fanOut.add(len(getattr(model, observers)))
+        return wrapper
+
+    def keyPressed(self, event):
+        if self.keyStart is None:
+            self.keyStart = time.perf_counter()
+            self.editor.after_idle(self.painted)
+
+    def painted(self):
+        #the canvas redraws itself in idle time too, so it is flushed before the clock stops
+        self.editor.update_idletasks()
+        #a frame held back by the editor's frame rate limit has not been painted yet
+        if getattr(self.editor, "frameJob", None) is not None:
+            self.editor.after(1, self.painted)
+            return
+        self.histogram("keystroke").add(time.perf_counter() - self.keyStart)
+        self.histogram("canvas.items", smallest=1).add(len(self.editor.find_all()))
+        self.keyStart = None
+
+    def summary(self):
+        keystroke = self.histogram("keystroke")
+        return f"Keystroke to paint p50: {keystroke.percentile(50) * 1000:.1f} ms, p99: {keystroke.percentile(99) * 1000:.1f} ms ({keystroke.count} keys)"
+
+    def export(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({name: histogram.toDict() for name, histogram in sorted(self.histograms.items())}, file, indent=2)
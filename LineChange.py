@@ -0,0 +1,7 @@
+#2.5
+#lines [start, start + removed) of the old text were replaced by inserted new lines
+class LineChange:
+    def __init__(self, start, removed, inserted):
+        self.start = start
+        self.removed = removed
+        self.inserted = inserted
@@ -1,5 +1,8 @@
+from collections import namedtuple
+
 #2.2
-class Location:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
\ No newline at end of file
+#An immutable position in the text, x is the column and y the line.
+#Locations are values, so they are shared instead of copied and a moved
+#cursor is a new Location.
+class Location(namedtuple("Location", ("x", "y"))):
+    __slots__ = ()
@@ -1,7 +1,7 @@
-from Location import Location
+from collections import namedtuple
 
 #2.2
-class LocationRange:
-    def __init__(self, start: Location, end: Location):
-        self.start = start
-        self.end = end
\ No newline at end of file
+#An immutable pair of locations, start is where the selection was anchored
+#and end follows the cursor, so start may come after end.
+class LocationRange(namedtuple("LocationRange", ("start", "end"))):
+    __slots__ = ()
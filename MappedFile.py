@@ -0,0 +1,90 @@
+import mmap
+import threading
+from array import array
+
+#A text file mapped into memory. The line-start index is built in one pass,
+#possibly on a background thread, and lines are decoded only when read.
+#Bytes that are not valid in the encoding are decoded to lone surrogates, which
+#FileSaver encodes back to the same bytes, so saving keeps what was not edited.
+#Lines are split at \n and a \r before it is dropped. The file is saved with the
+#line ending of its first line, so the lines of a file mixing \r\n and \n all
+#get that ending.
+class MappedText:
+    ERRORS = "surrogateescape"
+
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self.file = open(path, "rb")
+        self.size = self.file.seek(0, 2)
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.starts = array("q", [0])
+        self.position = 0
+        self.done = self.size == 0
+        self.thread = None
+        first = self.data.find(b"\n")
+        self.newline = "\r\n" if first > 0 and self.data[first - 1] == 13 else "\n"
+        #saves still reading the lines, the file is closed when the last of them is done
+        self.readers = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def indexLines(self, minLines=None):
+        #scans for line starts until minLines lines are complete or the whole file is indexed
+        find = self.data.find
+        starts = self.starts
+        position = self.position
+        while not self.done:
+            newline = find(b"\n", position)
+            if newline < 0:
+                self.done = True
+                break
+            position = newline + 1
+            starts.append(position)
+            if minLines is not None and len(starts) > minLines:
+                break
+        self.position = position
+
+    def startIndexing(self):
+        self.thread = threading.Thread(target=self.indexLines, daemon=True)
+        self.thread.start()
+
+    def completeLines(self):
+        #the last indexed line is only known to be complete when the whole file is indexed
+        return len(self.starts) if self.done else len(self.starts) - 1
+
+    def line(self, index):
+        start = self.starts[index]
+        end = self.starts[index + 1] - 1 if index + 1 < len(self.starts) else self.size
+        if end > start and self.data[end - 1] == 13:    #drop the \r of \r\n line endings
+            end -= 1
+        return self.data[start:end].decode(self.encoding, errors=self.ERRORS)
+
+    def retain(self):
+        with self.lock:
+            self.readers += 1
+
+    def release(self):
+        with self.lock:
+            self.readers -= 1
+            if not self.closed or self.readers > 0:
+                return
+        self.unmap()
+
+    #stops the background indexer and closes the file, lines cannot be read afterwards
+    def close(self):
+        self.done = True
+        if self.thread is not None:
+            self.thread.join()
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.readers > 0:
+                return
+        self.unmap()
+
+    def unmap(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
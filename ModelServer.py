@@ -0,0 +1,291 @@
+import asyncio
+import json
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+from Location import Location
+from LocationRange import LocationRange
+from Observers import CursorObserver, TextObserver
+from MappedFile import MappedText
+
+#Local server through which other programs, like formatters and test drivers,
+#edit the model of the editor. Clients connect to a Unix socket, or to a port
+#on localhost where there are none, and exchange one JSON object per line:
+#
+#   {"id": 1, "op": "insertText", "args": ["text"]}    ->  {"id": 1, "result": null}
+#   {"id": 2, "op": "linesRange", "args": [0, 10]}     ->  {"id": 2, "result": ["line", ...]}
+#   {"id": 3, "op": "nope"}                            ->  {"id": 3, "error": "unknown operation nope"}
+#
+#Replies to requests the model carries out come in the order of the requests.
+#Others, like errors for unknown operations, may overtake them, so clients match
+#replies by id. Locations are [x, y] and ranges [[x, y], [x, y]]. After
+#{"op": "subscribe"} a client also gets {"event": "text", "version": 7,
+#"changes": [[start, removed, inserted], ...]} when the text changed, changes is
+#null when all of it did, and {"event": "cursor", "location": [x, y]} when the
+#cursor moved.
+#
+#The model is only touched on its own thread. Requests wait in a queue until
+#applyPending, which the editor calls once per frame, applies all of them as
+#one edit, so observers and the canvas see one change however many requests
+#came in. Undo and redo are applied between those edits, since they act on
+#finished undo steps. Without an editor start(drive=True) has the server call
+#it itself.
+class ModelServer(TextObserver, CursorObserver):
+    #longest request line, a whole document may be sent as one insertText
+    MAX_REQUEST = 64 * 1024 * 1024
+    #reading from a client pauses while this much of its replies is not sent yet
+    MAX_UNSENT = 4 * 1024 * 1024
+
+    def __init__(self, model, path=None, host="127.0.0.1", port=0, fps=60):
+        self.model = model
+        self.path = path
+        self.host = host
+        self.port = port
+        self.fps = fps
+        #(client, id, operation, args) waiting for the next frame
+        self.requests = queue.SimpleQueue()
+        self.subscribers = set()
+        self.loop = None
+        self.thread = None
+        self.stopped = None
+        self.started = threading.Event()
+        self.drive = False
+        self.tickJob = None
+        self.lastTick = 0
+        model.addTextObserver(self)
+        model.addCursorObserver(self)
+
+    #a socket in the temp directory where Unix sockets exist, None to listen on localhost
+    @staticmethod
+    def defaultPath():
+        if not hasattr(socket, "AF_UNIX"):
+            return None
+        return os.path.join(tempfile.gettempdir(), f"textEditor-{os.getpid()}.sock")
+
+    #starts listening on a thread of its own and returns the address
+    def start(self, drive=False):
+        self.drive = drive
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.serve()), daemon=True)
+        self.thread.start()
+        self.started.wait()
+        return self.address()
+
+    def address(self):
+        return self.path if self.path is not None else f"{self.host}:{self.port}"
+
+    def stop(self):
+        if self.loop is not None:
+            loop, self.loop = self.loop, None
+            loop.call_soon_threadsafe(self.stopped.set)
+            self.thread.join()
+        self.model.removeTextObserver(self)
+        self.model.removeCursorObserver(self)
+
+    #serves another model, what was sent for the old one is applied to it first
+    def setModel(self, model):
+        self.applyPending()
+        self.model.removeTextObserver(self)
+        self.model.removeCursorObserver(self)
+        self.model = model
+        model.addTextObserver(self)
+        model.addCursorObserver(self)
+        self.updateText(None)
+        self.updateCursorLocation(model.cursorLocation)
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        if self.path is not None:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            server = await asyncio.start_unix_server(self.handle, path=self.path, limit=self.MAX_REQUEST)
+            #only the user running the editor may connect
+            os.chmod(self.path, 0o600)
+        else:
+            server = await asyncio.start_server(self.handle, self.host, self.port, limit=self.MAX_REQUEST)
+            self.port = server.sockets[0].getsockname()[1]
+        self.started.set()
+        async with server:
+            await self.stopped.wait()
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    id, operation, args = request.get("id"), request["op"], request.get("args", [])
+                    if not isinstance(operation, str):
+                        raise TypeError("op is not a string")
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    self.send(writer, {"id": None, "error": "malformed request"})
+                    continue
+                if operation == "subscribe":
+                    self.subscribers.add(writer)
+                    self.send(writer, {"id": id, "result": self.model.version})
+                elif operation == "unsubscribe":
+                    self.subscribers.discard(writer)
+                    self.send(writer, {"id": id, "result": None})
+                elif operation not in OPERATIONS or not isinstance(args, list):
+                    self.send(writer, {"id": id, "error": f"unknown operation {operation}"})
+                else:
+                    self.requests.put((writer, id, operation, args))
+                    if self.drive:
+                        self.scheduleTick()
+                if writer.transport.get_write_buffer_size() > self.MAX_UNSENT:
+                    await writer.drain()
+        finally:
+            self.subscribers.discard(writer)
+            writer.close()
+
+    def send(self, writer, message):
+        if not writer.is_closing():
+            writer.write((json.dumps(message) + "\n").encode("utf-8"))
+
+    def sendAll(self, replies):
+        for writer, message in replies:
+            self.send(writer, message)
+
+    def broadcast(self, message):
+        data = (json.dumps(message) + "\n").encode("utf-8")
+        for writer in self.subscribers:
+            if not writer.is_closing():
+                writer.write(data)
+
+    #without an editor the server applies the requests once per frame itself
+    def scheduleTick(self):
+        if self.tickJob is None:
+            delay = max(0, self.lastTick + 1 / self.fps - time.perf_counter())
+            self.tickJob = self.loop.call_later(delay, self.tick)
+
+    def tick(self):
+        self.tickJob = None
+        self.lastTick = time.perf_counter()
+        self.applyPending()
+
+    #applies the requests that came in since the last frame as one edit and
+    #returns how many there were, call on the thread that owns the model
+    def applyPending(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self.requests.get_nowait())
+            except queue.Empty:
+                break
+        if not batch or self.loop is None:
+            return 0
+        replies = []
+        try:
+            #undo and redo act on finished steps, so they run outside the edit of the requests around them
+            requests = []
+            for request in batch:
+                if request[2] in ("undo", "redo"):
+                    self.apply(requests, replies)
+                    self.apply([request], replies)
+                    requests = []
+                else:
+                    requests.append(request)
+            self.apply(requests, replies)
+        finally:
+            self.callInLoop(self.sendAll, replies)
+        return len(batch)
+
+    def apply(self, requests, replies):
+        if not requests:
+            return
+        with self.model.edit():
+            for writer, id, operation, args in requests:
+                try:
+                    replies.append((writer, {"id": id, "result": OPERATIONS[operation](self.model, *args)}))
+                except (TypeError, ValueError, IndexError, KeyError, AttributeError) as error:
+                    replies.append((writer, {"id": id, "error": f"{type(error).__name__}: {error}"}))
+
+    def callInLoop(self, function, *args):
+        loop = self.loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(function, *args)
+            except RuntimeError:
+                #the loop closed while stopping
+                pass
+
+    def updateText(self, changes=None):
+        if self.subscribers:
+            changes = [[change.start, change.removed, change.inserted] for change in changes] if changes is not None else None
+            self.callInLoop(self.broadcast, {"event": "text", "version": self.model.version, "changes": changes})
+
+    def updateCursorLocation(self, loc):
+        if self.subscribers:
+            self.callInLoop(self.broadcast, {"event": "cursor", "location": [loc.x, loc.y]})
+
+#arguments sent by clients are checked before they reach the model, a wrong
+#value recorded for undo or in the journal would only fail later, outside the request
+
+def text(value):
+    if not isinstance(value, str):
+        raise TypeError(f"expected a string, not {json.dumps(value)}")
+    #lone surrogates other than those of undecodable bytes could never be saved
+    value.encode("utf-8", MappedText.ERRORS)
+    return value
+
+def integer(value):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TypeError(f"expected an integer, not {json.dumps(value)}")
+    return value
+
+#a location sent by a client, it has to lie inside the text
+def location(model, value):
+    if not isinstance(value, list) or len(value) != 2:
+        raise TypeError(f"expected [x, y], not {json.dumps(value)}")
+    x, y = integer(value[0]), integer(value[1])
+    if not 0 <= y < len(model.lines) or not 0 <= x <= len(model.lines[y]):
+        raise ValueError(f"no location {value} in the text")
+    return Location(x, y)
+
+def locationRange(model, value):
+    if not isinstance(value, list) or len(value) != 2:
+        raise TypeError(f"expected [[x, y], [x, y]], not {json.dumps(value)}")
+    return LocationRange(location(model, value[0]), location(model, value[1]))
+
+def setCursor(model, value):
+    model.moveCursor(location(model, value))
+
+def setSelectionRange(model, value):
+    model.setSelectionRange(locationRange(model, value) if value is not None else None)
+
+def linesRange(model, start, end):
+    return list(model.linesRange(max(0, integer(start)), min(integer(end), len(model.lines))))
+
+#what clients may call, every operation gets the model and the args of the request,
+#Location and LocationRange are namedtuples and go back to the client as lists
+OPERATIONS = {
+    "insert": lambda model, c: model.insert(text(c)),
+    "insertText": lambda model, value: model.insertText(text(value)),
+    "deleteRange": lambda model, value: model.deleteRange(locationRange(model, value)),
+    "deleteBefore": lambda model: model.deleteBefore(),
+    "deleteAfter": lambda model: model.deleteAfter(),
+    "getText": lambda model: model.getText(),
+    "getTextFromRange": lambda model, value: model.getTextFromRange(locationRange(model, value)),
+    "linesRange": linesRange,
+    "lineCount": lambda model: model.lineCount(),
+    "version": lambda model: model.version,
+    "getCursor": lambda model: model.cursorLocation,
+    "setCursor": setCursor,
+    "getSelectionRange": lambda model: model.getSelectionRange(),
+    "setSelectionRange": setSelectionRange,
+    "undo": lambda model: model.undo(),
+    "redo": lambda model: model.redo(),
+}
+for name in ("moveCursorLeft", "moveCursorRight", "moveCursorUp", "moveCursorDown",
+             "selectionRangeLeft", "selectionRangeRight", "selectionRangeUp", "selectionRangeDown"):
+    OPERATIONS[name] = lambda model, name=name: getattr(model, name)()
@@ -14,7 +14,8 @@ class CursorObserverHelper(CursorObserver):
 
 #2.5
 class TextObserver:
-    def updateText(self):
+    #changes is a list of LineChange objects, or None when the whole text was replaced
+    def updateText(self, changes=None):
         pass
 
 #2.7
@@ -22,7 +23,23 @@ class ClipboardObserver:
     def updateClipboard(self):
         pass
 
+    #count of the oldest entries dropped to keep the clipboard within its limits
+    def clipboardEvicted(self, count):
+        pass
+
 #2.9
 class SelectionObserver:
     def selectionChanged(self):
-        pass
\ No newline at end of file
+        pass
+
+class SaveObserver:
+    def saveProgress(self, written, total):
+        pass
+
+    def saveFinished(self, path, error):
+        pass
+
+#results plugins report through the model instead of showing them in a window
+class ResultObserver:
+    def pluginResult(self, title, message, data):
+        pass
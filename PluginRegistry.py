@@ -0,0 +1,148 @@
+import ast
+import os
+import inspect
+import json
+import hashlib
+import importlib.util
+import importlib.metadata
+from Plugins.PluginInterface import PluginInterface
+
+#2.11
+#A plugin known from the manifest. The module is imported the first time load() is called.
+class LazyPlugin:
+    def __init__(self, name, description, className, path=None, entryPoint=None):
+        self.name = name
+        self.description = description
+        self.className = className
+        self.path = path
+        self.entryPoint = entryPoint
+        self.plugin = None
+
+    def getName(self):
+        return self.name
+
+    def getDescriptions(self):
+        return self.description
+
+    def load(self):
+        if self.plugin is None:
+            if self.entryPoint is not None:
+                pluginClass = importlib.metadata.EntryPoint(self.name, self.entryPoint, PluginRegistry.ENTRY_POINT_GROUP).load()
+            else:
+                pluginClass = getattr(loadModule(self.path), self.className)
+            self.plugin = pluginClass()
+            self.plugin.sourcePath = self.path or inspect.getfile(pluginClass)
+        return self.plugin
+
+def loadModule(path):
+    spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+#Finds plugins in the Plugins package next to this file, in extra directories and
+#in the textEditorPy.plugins entry point group. What each file contains is kept in
+#a manifest keyed by file mtime, size and hash, so unchanged plugins are listed
+#without reading or importing them.
+class PluginRegistry:
+    ENTRY_POINT_GROUP = "textEditorPy.plugins"
+
+    def __init__(self, directories=None, cachePath=None):
+        self.directories = directories if directories is not None else [os.path.join(os.path.dirname(os.path.abspath(__file__)), "Plugins")]
+        self.cachePath = cachePath or os.path.join(os.path.expanduser("~"), ".cache", "textEditorPy", "plugins.json")
+        self.manifest = self.readManifest()
+        self.changed = False
+
+    def readManifest(self):
+        try:
+            with open(self.cachePath, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def writeManifest(self):
+        try:
+            os.makedirs(os.path.dirname(self.cachePath), exist_ok=True)
+            with open(self.cachePath, "w", encoding="utf-8") as file:
+                json.dump(self.manifest, file)
+        except OSError:
+            pass
+
+    def discover(self):
+        plugins = []
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                continue
+            for file in sorted(os.listdir(directory)):
+                if file.endswith(".py"):
+                    path = os.path.join(directory, file)
+                    for entry in self.fileEntries(path):
+                        plugins.append(LazyPlugin(entry["name"], entry["description"], entry["className"], path=path))
+        for entryPoint in importlib.metadata.entry_points(group=self.ENTRY_POINT_GROUP):
+            entry = self.entryPointEntry(entryPoint)
+            plugins.append(LazyPlugin(entry["name"], entry["description"], entry["className"], entryPoint=entryPoint.value))
+        if self.changed:
+            self.writeManifest()
+            self.changed = False
+        return plugins
+
+    def fileEntries(self, path):
+        stat = os.stat(path)
+        cached = self.manifest.get(path)
+        if cached is not None and cached["mtime"] == stat.st_mtime and cached["size"] == stat.st_size:
+            return cached["plugins"]
+
+        with open(path, "rb") as file:
+            source = file.read()
+        digest = hashlib.sha256(source).hexdigest()
+        if cached is None or cached["hash"] != digest:
+            cached = {"hash": digest, "plugins": self.scanSource(path, source)}
+        cached["mtime"] = stat.st_mtime
+        cached["size"] = stat.st_size
+        self.manifest[path] = cached
+        self.changed = True
+        return cached["plugins"]
+
+    def scanSource(self, path, source):
+        #reads plugin classes and their literal names from the syntax tree, without running the file
+        entries = []
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            return entries
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+            if not any((isinstance(base, ast.Name) and base.id == "PluginInterface") or (isinstance(base, ast.Attribute) and base.attr == "PluginInterface") for base in node.bases):
+                continue
+            returns = {}
+            for item in node.body:
+                if isinstance(item, ast.FunctionDef) and item.name in ("getName", "getDescriptions"):
+                    if len(item.body) == 1 and isinstance(item.body[0], ast.Return) and isinstance(item.body[0].value, ast.Constant):
+                        returns[item.name] = item.body[0].value.value
+            if len(returns) < 2:
+                #the names are computed, so the plugin has to be imported once to get them
+                return self.importEntries(path)
+            entries.append({"className": node.name, "name": returns["getName"], "description": returns["getDescriptions"]})
+        return entries
+
+    def importEntries(self, path):
+        entries = []
+        module = loadModule(path)
+        for name, obj in module.__dict__.items():
+            if isinstance(obj, type) and issubclass(obj, PluginInterface) and obj is not PluginInterface:
+                plugin = obj()
+                entries.append({"className": name, "name": plugin.getName(), "description": plugin.getDescriptions()})
+        return entries
+
+    def entryPointEntry(self, entryPoint):
+        key = "entry-point:" + entryPoint.value
+        version = entryPoint.dist.version if entryPoint.dist is not None else None
+        cached = self.manifest.get(key)
+        if cached is not None and cached["version"] == version:
+            return cached
+        plugin = entryPoint.load()()
+        cached = {"version": version, "className": entryPoint.attr, "name": plugin.getName(), "description": plugin.getDescriptions()}
+        self.manifest[key] = cached
+        self.changed = True
+        return cached
@@ -0,0 +1,136 @@
+import os
+import threading
+import importlib.util
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from Location import Location
+from LocationRange import LocationRange
+
+#plugin instances loaded inside a worker process, keyed by source path and class name
+workerPlugins = {}
+
+def transformInWorker(path, className, lines):
+    key = (path, className)
+    if key not in workerPlugins:
+        spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        workerPlugins[key] = getattr(module, className)()
+    return workerPlugins[key].transformLines(lines)
+
+#Runs the transformLines of a plugin over a snapshot of the model. A feeder thread
+#cuts the lines into chunks for the pool, whole lines even when the selection starts
+#or ends inside one, so that the transform sees every word whole, poll() collects finished chunks in order
+#on the calling thread and keeps only the lines that changed, and when every chunk
+#is done the changes are applied as one edit, unless the text changed meanwhile.
+class PluginRunner:
+    threadPool = None
+    processPool = None
+
+    def __init__(self, model, plugin, chunkLines=4096):
+        self.model = model
+        self.plugin = plugin
+        self.chunkLines = chunkLines
+        self.version = model.version
+
+        selection = model.getSelectionRange() if plugin.getScope() == "selection" else None
+        if selection:
+            start, end = selection.start, selection.end
+            if end.y < start.y or (end.y == start.y and end.x < start.x):
+                start, end = end, start
+        else:
+            start, end = Location(0, 0), Location(len(model.lines[-1]), len(model.lines) - 1)
+        self.startLocation = start
+        self.endLocation = end
+        self.blocks = model.lines.snapshot()
+
+        self.chunks = []    #(first line, original lines, future) in document order
+        self.fed = False
+        self.replacements = []
+        self.linesDone = 0
+        self.status = "running"
+        self.error = None
+
+    def getExecutor(self):
+        path = getattr(self.plugin, "sourcePath", None)
+        if self.plugin.getExecutor() == "process" and path is not None:
+            if PluginRunner.processPool is None:
+                #spawned workers do not inherit the Tk state of the editor process
+                PluginRunner.processPool = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+            return lambda lines: PluginRunner.processPool.submit(transformInWorker, path, type(self.plugin).__name__, lines)
+        if PluginRunner.threadPool is None:
+            PluginRunner.threadPool = ThreadPoolExecutor()
+        return lambda lines: PluginRunner.threadPool.submit(self.plugin.transformLines, lines)
+
+    def start(self):
+        threading.Thread(target=self.feed, args=(self.getExecutor(),), daemon=True).start()
+
+    def feed(self, submit):
+        try:
+            y = 0
+            chunk = []
+            chunkStart = self.startLocation.y
+            for block in self.blocks:
+                if y + len(block) <= self.startLocation.y:
+                    y += len(block)
+                    continue
+                for line in block:
+                    if self.startLocation.y <= y <= self.endLocation.y:
+                        chunk.append(line)
+                        if len(chunk) == self.chunkLines:
+                            self.chunks.append((chunkStart, chunk, submit(chunk)))
+                            chunkStart += len(chunk)
+                            chunk = []
+                    y += 1
+                if y > self.endLocation.y:
+                    break
+            if chunk:
+                self.chunks.append((chunkStart, chunk, submit(chunk)))
+        except Exception as error:
+            self.error = error
+        self.fed = True
+
+    def total(self):
+        return self.endLocation.y - self.startLocation.y + 1
+
+    #collects finished chunks and returns True while the plugin is still running
+    def poll(self):
+        if self.status != "running":
+            return False
+        while self.chunks and self.chunks[0][2].done():
+            chunkStart, original, future = self.chunks.pop(0)
+            try:
+                result = future.result()
+                if len(result) != len(original):
+                    raise ValueError(self.plugin.getName() + " returned a different number of lines")
+            except Exception as error:
+                if isinstance(error, BrokenProcessPool):
+                    PluginRunner.processPool = None
+                self.error = error
+                break
+            for i, (old, new) in enumerate(zip(original, result)):
+                if old != new:
+                    #only the selected columns are replaced, the text before and after them is
+                    #cut from the transformed line by its length in case the transform changed that
+                    y = chunkStart + i
+                    start = self.startLocation.x if y == self.startLocation.y else 0
+                    end = self.endLocation.x if y == self.endLocation.y else len(old)
+                    text = new[start:len(new) - (len(old) - end)]
+                    if text != old[start:end]:
+                        self.replacements.append((LocationRange(Location(start, y), Location(end, y)), text))
+            self.linesDone += len(original)
+
+        if self.error is not None:
+            self.status = "failed"
+            return False
+        if not self.fed or self.chunks:
+            return True
+
+        if self.model.version != self.version:
+            self.status = "stale"
+        else:
+            if self.replacements:
+                self.model.applyReplacements(self.replacements)
+            self.status = "applied"
+        return False
@@ -13,4 +13,21 @@ class PluginInterface(abc.ABC):
 
     @abc.abstractmethod
     def execute(self, model, ClipboardStack: ClipboardStack):
-        pass
\ No newline at end of file
+        pass
+
+    #Plugins that change the text line by line can also define transformLines(lines).
+    #It gets a chunk of lines and returns the same number of lines, and the editor
+    #then runs it over independent chunks in a thread or process pool.
+    transformLines = None
+
+    def isLineTransform(self):
+        return self.transformLines is not None
+
+    #"selection" runs the transform over the selected text when there is a selection,
+    #"document" always runs it over the whole document
+    def getScope(self):
+        return "document"
+
+    #"process" spreads the chunks over several cores, "thread" keeps them in this process
+    def getExecutor(self):
+        return "thread"
@@ -1,5 +1,4 @@
 from Plugins.PluginInterface import PluginInterface
-from tkinter import messagebox
 from Clipboard import ClipboardStack
 
 class StatisticsPlugin(PluginInterface):
@@ -10,8 +9,6 @@ class StatisticsPlugin(PluginInterface):
         return "This plugin calculates number of lines, words and characters in the text."
     
     def execute(self, model, clipboardStack: ClipboardStack): 
-        text = model.getText()
-        lines = len(text.split("\n"))
-        words = len(text.split())
-        characters = len(text)
-        messagebox.showinfo("Statistics", "Number of lines: " + str(lines) + "\nNumber of words: " + str(words) + "\nNumber of characters: " + str(characters))
+        lines, words, characters = model.getStatistics()
+        model.reportResult("Statistics", "Number of lines: " + str(lines) + "\nNumber of words: " + str(words) + "\nNumber of characters: " + str(characters),
+                           {"lines": lines, "words": words, "characters": characters})
@@ -1,5 +1,4 @@
 from Plugins.PluginInterface import PluginInterface
-from tkinter import messagebox
 from Clipboard import ClipboardStack
 
 class UppercasePlugin(PluginInterface):
@@ -7,13 +6,24 @@ class UppercasePlugin(PluginInterface):
         return "Uppercase"
     
     def getDescriptions(self):
-        return "This plugin converts all first letters of words to uppercase."
+        return "This plugin converts all first letters of words to uppercase, only in the selection when there is one."
     
     def execute(self, model, clipboardStack: ClipboardStack):
         text = model.getText()
         text = text.title()
         model.setText(text)
 
-        messagebox.showinfo("Uppercase", "All first letters of words are converted to uppercase.")
+        model.reportResult("Uppercase", "All first letters of words are converted to uppercase.")
+
+    #str.title never looks across a newline, so every line can be converted on its own
+    def transformLines(self, lines):
+        return [line.title() for line in lines]
+
+    #run from the editor it changes only the selected text, execute still converts the whole document
+    def getScope(self):
+        return "selection"
+
+    def getExecutor(self):
+        return "process"
     
         
@@ -0,0 +1,344 @@
+import sys
+
+#Buffer engines that store the lines of a TextEditorModel.
+#LineBuffer is the plain list engine and also defines the interface every
+#engine implements, BlockBuffer is the default engine for large documents.
+
+class LineBuffer:
+    def __init__(self, lines=None):
+        self.lines = list(lines) if lines is not None else [""]
+
+    #builds a buffer from the first count lines of a MappedText
+    @classmethod
+    def fromSource(cls, source, count):
+        return cls([source.line(i) for i in range(count)])
+
+    #appends lines [start, end) of a MappedText to the end of the buffer
+    def appendSource(self, source, start, end):
+        self.insertLines(len(self), [source.line(i) for i in range(start, end)])
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __getitem__(self, index):
+        return self.lines[index]
+
+    def __setitem__(self, index, line):
+        self.lines[index] = line
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            start, end, _ = index.indices(len(self))
+            self.deleteLines(start, end)
+        else:
+            self.pop(index)
+
+    def insert(self, index, line):
+        self.insertLines(index, [line])
+
+    def pop(self, index=-1):
+        if index < 0:
+            index += len(self)
+        line = self[index]
+        self.deleteLines(index, index + 1)
+        return line
+
+    def insertLines(self, index, lines):
+        self.lines[index:index] = lines
+
+    def deleteLines(self, start, end):
+        del self.lines[start:end]
+
+    def getLines(self, start, end):
+        return self.lines[start:end]
+
+    #returns the lines as a list of blocks that later edits do not change
+    def snapshot(self):
+        return [list(self.lines)]
+
+    #number of characters before the line, counting one newline per line
+    def lineOffset(self, index):
+        return sum(len(line) + 1 for line in self.lines[:index])
+
+    #returns (line, column) of a character offset, clamped to the end of the text
+    def offsetLine(self, offset):
+        for index, line in enumerate(self.lines):
+            if offset <= len(line):
+                return index, max(offset, 0)
+            offset -= len(line) + 1
+        return len(self.lines) - 1, len(self.lines[-1])
+
+    def charCount(self):
+        return self.lineOffset(len(self.lines)) - 1
+
+    #rough number of bytes the lines take in memory
+    def memoryUsage(self):
+        return sys.getsizeof(self.lines) + sum(map(sys.getsizeof, self.lines))
+
+    def replaceLines(self, start, end, lines):
+        common = min(end - start, len(lines))
+        for i in range(common):
+            self[start + i] = lines[i]
+        if end - start > common:
+            self.deleteLines(start + common, end)
+        else:
+            self.insertLines(start + common, lines[common:])
+
+
+#Fenwick tree over block sizes, used to find the block that holds a line
+#or a character offset
+class FenwickTree:
+    def __init__(self, values):
+        self.size = len(values)
+        self.tree = [0] * (self.size + 1)
+        for i, value in enumerate(values, 1):
+            self.tree[i] += value
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index, delta):
+        index += 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefixSum(self, index):
+        #sum of the first index values
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def search(self, value):
+        #returns (i, rest) where i is the first index whose prefix sum exceeds value
+        index = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            candidate = index + step
+            if candidate <= self.size and self.tree[candidate] <= value:
+                index = candidate
+                value -= self.tree[candidate]
+            step >>= 1
+        return index, value
+
+
+#A block of lines that are still in a MappedText, decoded only when read.
+#BlockBuffer turns it into a plain list before changing it.
+class MappedBlock:
+    def __init__(self, source, start, end):
+        self.source = source
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __iter__(self):
+        for i in range(self.start, self.end):
+            yield self.source.line(i)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, end, step = index.indices(len(self))
+            return [self.source.line(self.start + i) for i in range(start, end, step)]
+        if index < 0:
+            index += len(self)
+        return self.source.line(self.start + index)
+
+
+#Rope of line blocks with a Fenwick line-start index. Looking up, replacing,
+#inserting or deleting a line costs O(log blocks + BLOCK_SIZE) instead of
+#shifting the whole document like a single Python list does.
+#A second Fenwick tree over the character count of each block converts between
+#character offsets and lines in the same time. The count of a mapped block is
+#unknown until it is decoded, so that tree is built on the first offset query.
+class BlockBuffer(LineBuffer):
+    BLOCK_SIZE = 512
+
+    def __init__(self, lines=None):
+        lines = list(lines) if lines is not None else [""]
+        self.blocks = [lines[i:i + self.BLOCK_SIZE] for i in range(0, len(lines), self.BLOCK_SIZE)] or [[]]
+        self.chars = [blockChars(block) for block in self.blocks]
+        self.rebuildIndex()
+
+    @classmethod
+    def fromSource(cls, source, count):
+        buffer = cls([])
+        buffer.appendSource(source, 0, count)
+        return buffer
+
+    def appendSource(self, source, start, end):
+        blocks = [MappedBlock(source, i, min(i + self.BLOCK_SIZE, end)) for i in range(start, end, self.BLOCK_SIZE)]
+        kept = [i for i, block in enumerate(self.blocks) if block]
+        self.chars = [self.chars[i] for i in kept] + [None] * len(blocks) if kept or blocks else [0]
+        self.blocks = [self.blocks[i] for i in kept] + blocks or [[]]
+        self.rebuildIndex()
+
+    def replaceLines(self, start, end, lines):
+        #large replacements are cheaper as one splice of the blocks than line by line
+        if end - start > self.BLOCK_SIZE and len(lines) > self.BLOCK_SIZE:
+            self.deleteLines(start, end)
+            self.insertLines(start, lines)
+        else:
+            super().replaceLines(start, end, lines)
+
+    def snapshot(self):
+        #mapped blocks are never changed in place, so they can be shared
+        return [block if isinstance(block, MappedBlock) else list(block) for block in self.blocks]
+
+    def materialize(self, block):
+        if isinstance(self.blocks[block], MappedBlock):
+            self.blocks[block] = list(self.blocks[block])
+        return self.blocks[block]
+
+    def rebuildIndex(self):
+        self.count = sum(len(block) for block in self.blocks)
+        self.index = FenwickTree([len(block) for block in self.blocks])
+        self.charIndex = None if None in self.chars else FenwickTree(self.chars)
+
+    def ensureCharIndex(self):
+        if self.charIndex is None:
+            self.chars = [blockChars(block) if chars is None else chars for block, chars in zip(self.blocks, self.chars)]
+            self.charIndex = FenwickTree(self.chars)
+        return self.charIndex
+
+    def addChars(self, block, delta):
+        if self.chars[block] is not None:
+            self.chars[block] += delta
+            if self.charIndex is not None:
+                self.charIndex.add(block, delta)
+
+    def lineOffset(self, index):
+        if index >= self.count:
+            return self.charCount() + 1
+        block, offset = self.locate(index)
+        return self.ensureCharIndex().prefixSum(block) + blockChars(self.blocks[block][:offset])
+
+    def offsetLine(self, offset):
+        if offset <= 0:
+            return 0, 0
+        block, rest = self.ensureCharIndex().search(offset)
+        if block >= len(self.blocks):
+            return self.count - 1, len(self[self.count - 1])
+        first = self.index.prefixSum(block)
+        for i, line in enumerate(self.blocks[block]):
+            if rest <= len(line):
+                return first + i, rest
+            rest -= len(line) + 1
+        return first + len(self.blocks[block]) - 1, len(self.blocks[block][-1])
+
+    def charCount(self):
+        return self.ensureCharIndex().prefixSum(len(self.blocks)) - 1
+
+    def memoryUsage(self):
+        #lines of mapped blocks stay in the file until they are decoded
+        size = sys.getsizeof(self.blocks) + sys.getsizeof(self.index.tree)
+        for block in self.blocks:
+            size += sys.getsizeof(block)
+            if not isinstance(block, MappedBlock):
+                size += sum(map(sys.getsizeof, block))
+        return size
+
+    def locate(self, index):
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError("line index out of range")
+        return self.index.search(index)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for block in self.blocks:
+            yield from block
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, end, step = index.indices(self.count)
+            if step != 1:
+                return self.getLines(0, self.count)[index]
+            return self.getLines(start, end)
+        block, offset = self.locate(index)
+        return self.blocks[block][offset]
+
+    def __setitem__(self, index, line):
+        block, offset = self.locate(index)
+        target = self.materialize(block)
+        self.addChars(block, len(line) - len(target[offset]))
+        target[offset] = line
+
+    def getLines(self, start, end):
+        result = []
+        if start >= end:
+            return result
+        block, offset = self.locate(start)
+        while len(result) < end - start and block < len(self.blocks):
+            result.extend(self.blocks[block][offset:offset + end - start - len(result)])
+            block += 1
+            offset = 0
+        return result
+
+    def insertLines(self, index, lines):
+        if not lines:
+            return
+        if index < 0:
+            index += self.count
+        if index == self.count:
+            block, offset = len(self.blocks) - 1, len(self.blocks[-1])
+        else:
+            block, offset = self.locate(index)
+
+        target = self.materialize(block)
+        if len(target) + len(lines) <= 2 * self.BLOCK_SIZE:
+            target[offset:offset] = lines
+            self.index.add(block, len(lines))
+            self.addChars(block, blockChars(lines))
+            self.count += len(lines)
+        else:
+            #split the grown block back into regular sized blocks
+            merged = target[:offset] + list(lines) + target[offset:]
+            split = [merged[i:i + self.BLOCK_SIZE] for i in range(0, len(merged), self.BLOCK_SIZE)]
+            self.blocks[block:block + 1] = split
+            self.chars[block:block + 1] = [blockChars(part) for part in split]
+            self.rebuildIndex()
+
+    def deleteLines(self, start, end):
+        if start >= end:
+            return
+        firstBlock, firstOffset = self.locate(start)
+        lastBlock, lastOffset = self.locate(end - 1)
+
+        self.materialize(firstBlock)
+        self.materialize(lastBlock)
+        if firstBlock == lastBlock:
+            self.addChars(firstBlock, -blockChars(self.blocks[firstBlock][firstOffset:lastOffset + 1]))
+            del self.blocks[firstBlock][firstOffset:lastOffset + 1]
+            self.index.add(firstBlock, start - end)
+            self.count -= end - start
+            if not self.blocks[firstBlock] and len(self.blocks) > 1:
+                del self.blocks[firstBlock]
+                del self.chars[firstBlock]
+                self.rebuildIndex()
+            return
+
+        del self.blocks[lastBlock][:lastOffset + 1]
+        del self.blocks[firstBlock][firstOffset:]
+        del self.blocks[firstBlock + 1:lastBlock]
+        del self.chars[firstBlock + 1:lastBlock]
+        self.chars[firstBlock] = blockChars(self.blocks[firstBlock])
+        self.chars[firstBlock + 1] = blockChars(self.blocks[firstBlock + 1])
+        kept = [i for i, block in enumerate(self.blocks) if block]
+        self.chars = [self.chars[i] for i in kept] or [0]
+        self.blocks = [self.blocks[i] for i in kept] or [[]]
+        self.rebuildIndex()
+
+
+#characters in a list of lines, counting one newline per line
+def blockChars(lines):
+    return sum(map(len, lines)) + len(lines)
@@ -0,0 +1,231 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from Observers import TextObserver
+from TextBuffer import FenwickTree
+
+#Advance widths of the glyphs of one font. Each glyph is measured the first
+#time it is needed, and the widths are shared by every layout using the font.
+class FontMetrics:
+    fonts = {}
+
+    def __init__(self, measure, lineHeight):
+        self.measure = measure
+        self.lineHeight = lineHeight
+        self.widths = {}
+
+    #metrics of a tkinter.font.Font, created once per actual font
+    @classmethod
+    def forFont(cls, font):
+        key = tuple(sorted(font.actual().items()))
+        if key not in cls.fonts:
+            cls.fonts[key] = cls(font.measure, font.metrics("linespace"))
+        return cls.fonts[key]
+
+    def width(self, char):
+        width = self.widths.get(char)
+        if width is None:
+            width = self.widths[char] = self.measure(char)
+        return width
+
+#Pixel positions of the columns of a model's lines. The x of every column of
+#a line is kept in an array built from the glyph widths the first time the
+#line is laid out and dropped when an edit changes the line, so a redraw
+#measures nothing. Tabs advance to the next multiple of tabSize spaces.
+class TextLayout(TextObserver):
+    #more laid out lines than this and the cache is emptied, visible lines are laid out again on demand
+    MAX_CACHED_LINES = 20000
+
+    def __init__(self, model, metrics, tabSize=8):
+        self.model = model
+        self.metrics = metrics
+        self.tabSize = tabSize
+        self.reset()
+        model.addTextObserver(self)
+
+    def detach(self):
+        self.model.removeTextObserver(self)
+
+    def reset(self):
+        self.prefixes = [None] * len(self.model.lines)
+        self.cached = 0
+
+    def updateText(self, changes=None):
+        if changes is None:
+            self.reset()
+            return
+        for change in changes:
+            removed = self.prefixes[change.start:change.start + change.removed]
+            self.cached -= len(removed) - removed.count(None)
+            self.prefixes[change.start:change.start + change.removed] = [None] * change.inserted
+
+    @property
+    def lineHeight(self):
+        return self.metrics.lineHeight
+
+    def prefix(self, line):
+        #x of each column of the line, one entry more than the line has characters
+        prefix = self.prefixes[line]
+        if prefix is None:
+            if self.cached >= self.MAX_CACHED_LINES:
+                self.reset()
+            prefix = array("l", [0])
+            x = 0
+            tabWidth = self.tabSize * self.metrics.width(" ")
+            width = self.metrics.width
+            for char in self.model.lines[line]:
+                if char == "\t" and tabWidth:
+                    x += tabWidth - x % tabWidth
+                else:
+                    x += width(char)
+                prefix.append(x)
+            self.prefixes[line] = prefix
+            self.cached += 1
+        return prefix
+
+    def columnToX(self, line, column):
+        prefix = self.prefix(line)
+        return prefix[min(column, len(prefix) - 1)]
+
+    def xToColumn(self, line, x):
+        #the column boundary nearest to x
+        prefix = self.prefix(line)
+        column = bisect_left(prefix, x)
+        if column == len(prefix):
+            return column - 1
+        if column > 0 and x - prefix[column - 1] < prefix[column] - x:
+            return column - 1
+        return column
+
+    def lineWidth(self, line):
+        return self.prefix(line)[-1]
+
+#Visual rows of soft wrapped lines. The columns where the rows of a line start
+#are computed from its column x positions when the line is first shown, and
+#dropped when the line is edited or the width changes. Until a line is wrapped
+#again it keeps its last row count, one row if it was never wrapped. Lines are
+#grouped into blocks like the lines of a BlockBuffer, and Fenwick trees over
+#the lines and rows of the blocks find the row of a line and the line of a row.
+#A changed row count or an edit inside one block updates them in place, only
+#a block that grows past 2 * BLOCK_SIZE lines or empties is cut again, so
+#neither an edit nor a resize wraps or sums the whole document.
+class WrapLayout(TextObserver):
+    BLOCK_SIZE = 256
+
+    def __init__(self, model, layout, width):
+        self.model = model
+        self.layout = layout
+        self.width = width
+        self.reset()
+        model.addTextObserver(self)
+
+    def detach(self):
+        self.model.removeTextObserver(self)
+
+    def reset(self):
+        count = len(self.model.lines)
+        self.breaks = [None] * count
+        #rows of each line beyond its first
+        self.extra = [0] * count
+        #lines and rows of each block, a block has 1 to 2 * BLOCK_SIZE lines
+        self.blockLines = [min(self.BLOCK_SIZE, count - i) for i in range(0, count, self.BLOCK_SIZE)]
+        self.blockRows = list(self.blockLines)
+        self.rebuildIndex()
+        #set when wrapping a line changed its row count, the editor clears it
+        self.rowsChanged = False
+
+    def rebuildIndex(self):
+        self.lineIndex = FenwickTree(self.blockLines)
+        self.rowIndex = FenwickTree(self.blockRows)
+
+    def setWidth(self, width):
+        if width != self.width:
+            self.width = width
+            self.breaks = [None] * len(self.breaks)
+
+    def updateText(self, changes=None):
+        if changes is None:
+            self.reset()
+            return
+        for change in changes:
+            start, end = change.start, change.start + change.removed
+            self.breaks[start:end] = [None] * change.inserted
+            if change.inserted != change.removed:
+                self.replaceLines(start, end, change.inserted)
+
+    def locate(self, line):
+        #returns (block, line within the block), the end of the last block for the line after the last
+        if line >= len(self.extra):
+            return len(self.blockLines) - 1, self.blockLines[-1]
+        return self.lineIndex.search(line)
+
+    #lines [start, end) were replaced by lines of one row each, until they are wrapped
+    def replaceLines(self, start, end, inserted):
+        first, offset = self.locate(start)
+        last = self.locate(end - 1)[0] if end > start else first
+        removedRows = end - start + sum(self.extra[start:end])
+        self.extra[start:end] = [0] * inserted
+        delta = inserted - (end - start)
+        if first == last and 0 < self.blockLines[first] + delta <= 2 * self.BLOCK_SIZE:
+            self.blockLines[first] += delta
+            self.lineIndex.add(first, delta)
+            self.blockRows[first] += inserted - removedRows
+            self.rowIndex.add(first, inserted - removedRows)
+            return
+        #the blocks the lines were in are cut again into regular blocks
+        size = self.BLOCK_SIZE
+        regionStart = start - offset
+        regionEnd = regionStart + sum(self.blockLines[first:last + 1]) + delta
+        blockLines = [min(size, regionEnd - i) for i in range(regionStart, regionEnd, size)]
+        self.blockLines[first:last + 1] = blockLines
+        self.blockRows[first:last + 1] = [lines + sum(self.extra[i:i + lines]) for i, lines in zip(range(regionStart, regionEnd, size), blockLines)]
+        self.rebuildIndex()
+
+    def rows(self, line):
+        #the columns where the rows of the line start, the first is always 0
+        breaks = self.breaks[line]
+        if breaks is None:
+            breaks = self.breaks[line] = self.wrapLine(line)
+            delta = len(breaks) - 1 - self.extra[line]
+            if delta:
+                block = self.locate(line)[0]
+                self.blockRows[block] += delta
+                self.rowIndex.add(block, delta)
+                self.extra[line] += delta
+                self.rowsChanged = True
+        return breaks
+
+    def wrapLine(self, line):
+        #breaks after the last space that fits, or inside a word longer than a row
+        prefix = self.layout.prefix(line)
+        text = self.model.lines[line]
+        breaks = [0]
+        start = 0
+        while prefix[-1] - prefix[start] > self.width:
+            end = max(bisect_right(prefix, prefix[start] + self.width) - 1, start + 1)
+            space = text.rfind(" ", start, end)
+            if space > start:
+                end = space + 1
+            breaks.append(end)
+            start = end
+        return breaks
+
+    def rowWithin(self, line, column):
+        return bisect_right(self.rows(line), column) - 1
+
+    def rowOfLine(self, line):
+        #the first row of the line, rowOfLine(len(lines)) is the number of rows
+        block, offset = self.locate(line)
+        return self.rowIndex.prefixSum(block) + offset + sum(self.extra[line - offset:line])
+
+    def lineAtRow(self, row):
+        #returns (line, row within the line) of a row, the last line for rows past the end
+        count = len(self.extra)
+        block, row = self.rowIndex.search(row)
+        if block >= len(self.blockRows):
+            line = count - 1
+            return line, row + self.rowIndex.prefixSum(len(self.blockRows)) - self.rowOfLine(line)
+        line = self.lineIndex.prefixSum(block)
+        while line < count - 1 and row > self.extra[line]:
+            row -= self.extra[line] + 1
+            line += 1
+        return line, row
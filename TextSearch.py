@@ -0,0 +1,156 @@
+import re
+from Location import Location
+from LocationRange import LocationRange
+from Observers import TextObserver
+
+#A chunk of consecutive lines and the trigrams that occur in them,
+#None while the trigrams have to be computed again
+class IndexChunk:
+    def __init__(self, count):
+        self.count = count
+        self.trigrams = None
+
+#Optional trigram index over chunks of lines. It follows the line changes of the
+#model as a text observer and only marks the touched chunks dirty, their trigrams
+#are computed again when a search reaches them. A literal search skips every chunk
+#that lacks one of the trigrams of the query.
+class TrigramIndex(TextObserver):
+    CHUNK_LINES = 256
+
+    def __init__(self, model):
+        self.model = model
+        self.rebuild()
+        model.addTextObserver(self)
+
+    def rebuild(self):
+        total = len(self.model.lines)
+        self.chunks = [IndexChunk(min(self.CHUNK_LINES, total - i)) for i in range(0, total, self.CHUNK_LINES)]
+
+    def updateText(self, changes=None):
+        if changes is None:
+            self.rebuild()
+            return
+        for change in changes:
+            self.applyChange(change)
+
+    def applyChange(self, change):
+        #find the chunk that holds the first changed line
+        i, offset = 0, change.start
+        while i < len(self.chunks) - 1 and offset >= self.chunks[i].count:
+            offset -= self.chunks[i].count
+            i += 1
+
+        #take the removed lines out of this and the following chunks
+        j, remaining = i, change.removed
+        while remaining > 0 and j < len(self.chunks):
+            taken = min(remaining, self.chunks[j].count - offset)
+            self.chunks[j].count -= taken
+            self.chunks[j].trigrams = None
+            remaining -= taken
+            j += 1
+            offset = 0
+
+        chunk = self.chunks[i]
+        chunk.count += change.inserted
+        chunk.trigrams = None
+        if chunk.count > 2 * self.CHUNK_LINES:
+            self.chunks[i:i + 1] = [IndexChunk(min(self.CHUNK_LINES, chunk.count - k)) for k in range(0, chunk.count, self.CHUNK_LINES)]
+        self.chunks = [chunk for chunk in self.chunks if chunk.count > 0] or [IndexChunk(len(self.model.lines))]
+
+    def candidateRanges(self, query):
+        #yields (first line, end line) of the chunks that may contain the query
+        needed = trigrams(query.lower())
+        start = 0
+        for chunk in self.chunks:
+            if chunk.trigrams is None:
+                chunk.trigrams = set()
+                for line in self.model.lines.getLines(start, start + chunk.count):
+                    chunk.trigrams.update(trigrams(line.lower()))
+            if needed <= chunk.trigrams:
+                yield start, start + chunk.count
+            start += chunk.count
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+#Find and replace over the lines of a model, chunk by chunk, without joining the
+#whole text. Matches never span lines.
+class TextSearch:
+    CHUNK_LINES = 4096
+
+    def __init__(self, model):
+        self.model = model
+        self.index = None
+
+    def enableIndex(self):
+        if self.index is None:
+            self.index = TrigramIndex(self.model)
+
+    def disableIndex(self):
+        if self.index is not None:
+            self.model.removeTextObserver(self.index)
+            self.index = None
+
+    def compile(self, query, regex, ignoreCase):
+        if "\n" in query:
+            raise ValueError("search queries cannot span lines")
+        if regex or ignoreCase:
+            return re.compile(query if regex else re.escape(query), re.IGNORECASE if ignoreCase else 0)
+        return None
+
+    def lines(self, query, regex, start=0, end=None):
+        #yields (line number, line) for every line that may contain the query, chunk by chunk
+        end = len(self.model.lines) if end is None else end
+        if self.index is not None and not regex and len(query) >= 3:
+            ranges = ((max(first, start), min(last, end)) for first, last in self.index.candidateRanges(query) if last > start and first < end)
+        else:
+            ranges = ((first, min(first + self.CHUNK_LINES, end)) for first in range(start, end, self.CHUNK_LINES))
+        for first, last in ranges:
+            yield from enumerate(self.model.lines.getLines(first, last), first)
+
+    def matches(self, query, regex=False, ignoreCase=False, start=0, end=None):
+        #yields (line, match start, match end) in document order
+        pattern = self.compile(query, regex, ignoreCase)
+        for y, line in self.lines(query, regex, start, end):
+            if pattern is None:
+                x = line.find(query)
+                while x >= 0 and query:
+                    yield y, x, x + len(query)
+                    x = line.find(query, x + len(query))
+            else:
+                for match in pattern.finditer(line):
+                    if match.end() > match.start():
+                        yield y, match.start(), match.end()
+
+    def findAll(self, query, regex=False, ignoreCase=False):
+        for y, x0, x1 in self.matches(query, regex, ignoreCase):
+            yield LocationRange(Location(x0, y), Location(x1, y))
+
+    def findNext(self, query, location, regex=False, ignoreCase=False):
+        #the first match at or after the location, wrapping around to the start of the document
+        for y, x0, x1 in self.matches(query, regex, ignoreCase, start=location.y):
+            if y > location.y or x0 >= location.x:
+                return LocationRange(Location(x0, y), Location(x1, y))
+        for y, x0, x1 in self.matches(query, regex, ignoreCase, end=location.y + 1):
+            return LocationRange(Location(x0, y), Location(x1, y))
+        return None
+
+    def replaceAll(self, query, replacement, regex=False, ignoreCase=False):
+        #every changed line is replaced in one edit and one undo step, returns the number of matches
+        pattern = self.compile(query, regex, ignoreCase)
+        #only a regex replacement is a template, a literal one may hold backslashes like C:\new
+        template = replacement if regex else (lambda match: replacement)
+        replacements = []
+        count = 0
+        for y, line in self.lines(query, regex):
+            if pattern is None:
+                found = line.count(query) if query else 0
+                text = line.replace(query, replacement) if found else line
+            else:
+                text, found = pattern.subn(template, line)
+            if found:
+                count += found
+                replacements.append((LocationRange(Location(0, y), Location(len(line), y)), text))
+        if replacements:
+            self.model.applyReplacements(replacements)
+        return count
@@ -0,0 +1,126 @@
+from collections import deque
+from Location import Location
+
+#2.8
+#one recorded edit: at location the text removed was replaced by the text inserted
+class EditCommand:
+    def __init__(self, location: Location, removed: str, inserted: str):
+        self.location = location
+        self.removed = removed
+        self.inserted = inserted
+
+    def size(self):
+        #rough memory cost of the command in bytes
+        return len(self.removed) + len(self.inserted) + 100
+
+    def isTyping(self):
+        return self.removed == "" and len(self.inserted) == 1 and self.inserted != "\n"
+
+    def isBackspace(self):
+        return self.inserted == "" and len(self.removed) == 1 and self.removed != "\n"
+
+#all commands recorded by one model operation, undone and redone together
+class UndoStep:
+    def __init__(self, cursor: Location):
+        self.commands = []
+        self.cursorBefore = cursor
+        self.cursorAfter = None
+        self.size = 0
+
+    def add(self, command: EditCommand):
+        self.commands.append(command)
+        self.size += command.size()
+
+    #runs of typing or backspacing are merged into the previous step
+    def merge(self, step):
+        if len(self.commands) != 1 or len(step.commands) != 1:
+            return False
+        last, command = self.commands[0], step.commands[0]
+        if last.location.y != command.location.y:
+            return False
+
+        if last.removed == "" and "\n" not in last.inserted and command.isTyping() and command.location.x == last.location.x + len(last.inserted):
+            last.inserted += command.inserted
+        elif last.inserted == "" and "\n" not in last.removed and command.isBackspace() and command.location.x == last.location.x - 1:
+            last.removed = command.removed + last.removed
+            last.location = command.location
+        else:
+            return False
+
+        self.size += len(command.inserted) + len(command.removed)
+        self.cursorAfter = step.cursorAfter
+        return True
+
+class UndoManager:
+    def __init__(self, maxBytes=16 * 1024 * 1024):
+        self.maxBytes = maxBytes
+        self.undoStack = deque()
+        self.redoStack = []
+        self.size = 0
+        self.current = None
+        self.cursorBefore = None
+        self.recording = True
+        #typing is only merged into a step that was just recorded, never into one uncovered by undo
+        self.mergeable = False
+
+    #the step itself is only created by the first recorded command,
+    #so operations that just move the cursor allocate nothing here
+    def beginStep(self, cursor: Location):
+        self.current = None
+        self.cursorBefore = cursor if self.recording else None
+
+    def record(self, command: EditCommand):
+        if self.cursorBefore is not None and self.recording:
+            if self.current is None:
+                self.current = UndoStep(self.cursorBefore)
+            self.current.add(command)
+
+    def endStep(self, cursor: Location):
+        step, self.current, self.cursorBefore = self.current, None, None
+        if step is None or not step.commands:
+            return
+        step.cursorAfter = cursor
+
+        for redone in self.redoStack:
+            self.size -= redone.size
+        self.redoStack.clear()
+
+        before = self.undoStack[-1].size if self.undoStack else 0
+        if self.mergeable and self.undoStack and self.undoStack[-1].merge(step):
+            self.size += self.undoStack[-1].size - before
+        else:
+            self.undoStack.append(step)
+            self.size += step.size
+        self.mergeable = True
+
+        #the oldest steps are forgotten first when the history is over its budget
+        while self.size > self.maxBytes and len(self.undoStack) > 1:
+            self.size -= self.undoStack.popleft().size
+
+    def canUndo(self):
+        return len(self.undoStack) > 0
+
+    def canRedo(self):
+        return len(self.redoStack) > 0
+
+    def popUndo(self):
+        if not self.undoStack:
+            return None
+        step = self.undoStack.pop()
+        self.redoStack.append(step)
+        self.mergeable = False
+        return step
+
+    def popRedo(self):
+        if not self.redoStack:
+            return None
+        step = self.redoStack.pop()
+        self.undoStack.append(step)
+        self.mergeable = False
+        return step
+
+    def clear(self):
+        self.undoStack.clear()
+        self.redoStack.clear()
+        self.size = 0
+        self.mergeable = False
@@ -0,0 +1,138 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from textEditorModel import TextEditorModel
+from Observers import ResultObserver
+from FileSaver import FileSaver
+from PluginRegistry import PluginRegistry
+
+#Runs editor plugins over many files without a window:
+#
+#   python batch.py --plugin Uppercase --plugin Statistics --write --output stats.json "docs/**/*.txt"
+#
+#Files are spread over a process pool, every file is opened in its own
+#TextEditorModel and what the plugins report through the model is collected
+#instead of being shown in message boxes.
+
+class ResultCollector(ResultObserver):
+    def __init__(self):
+        self.results = []
+
+    def pluginResult(self, title, message, data):
+        self.results.append({"title": title, "message": message, "data": data})
+
+#plugins are discovered once in every worker process
+plugins = None
+
+def findPlugins(names):
+    global plugins
+    if plugins is None:
+        plugins = {plugin.getName(): plugin for plugin in PluginRegistry().discover()}
+    missing = [name for name in names if name not in plugins]
+    if missing:
+        raise KeyError("unknown plugins: " + ", ".join(missing))
+    return [plugins[name].load() for name in names]
+
+def processFile(path, pluginNames, write):
+    start = time.perf_counter()
+    report = {"path": path, "results": [], "changed": False, "error": None}
+    model = None
+    try:
+        model = TextEditorModel("")
+        model.openFile(path, firstLines=None)
+        model.syncLoading()
+        version = model.version
+        collector = ResultCollector()
+        model.addResultObserver(collector)
+        for plugin in findPlugins(pluginNames):
+            with model.edit():
+                plugin.execute(model, model.clipboard)
+            for result in collector.results:
+                result["plugin"] = plugin.getName()
+            report["results"].extend(collector.results)
+            collector.results = []
+
+        report["changed"] = model.version != version
+        if write and report["changed"]:
+            saver = FileSaver(model, path)
+            saver.run()
+            while not saver.events.empty():
+                kind, value = saver.events.get()
+                if kind == "finished" and value is not None:
+                    raise value
+        report["lines"], report["words"], report["characters"] = model.getStatistics()
+    except Exception as error:
+        #plugins may raise anything, one failing file must not cost the report of the others
+        report["error"] = f"{type(error).__name__}: {error}"
+    finally:
+        if model is not None:
+            model.closeFile()
+    report["seconds"] = time.perf_counter() - start
+    return report
+
+def expand(patterns):
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            paths.extend(path for path in sorted(glob.glob(pattern, recursive=True)) if os.path.isfile(path))
+        else:
+            #a file named explicitly is kept, so that a missing one is reported as an error
+            paths.append(pattern)
+    return list(dict.fromkeys(paths))
+
+def aggregate(reports):
+    totals = {"files": len(reports), "failed": 0, "changed": 0, "lines": 0, "words": 0, "characters": 0, "seconds": 0}
+    plugins = {}
+    for report in reports:
+        totals["seconds"] += report["seconds"]
+        if report["error"] is not None:
+            totals["failed"] += 1
+            continue
+        totals["changed"] += report["changed"]
+        for key in ("lines", "words", "characters"):
+            totals[key] += report[key]
+        for result in report["results"]:
+            summary = plugins.setdefault(result["plugin"], {"results": 0, "data": {}})
+            summary["results"] += 1
+            #numbers the plugins report are summed over all files
+            for key, value in (result["data"] or {}).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    summary["data"][key] = summary["data"].get(key, 0) + value
+    return {"totals": totals, "plugins": plugins}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run text editor plugins over files without a window")
+    parser.add_argument("patterns", nargs="+", help="files or glob patterns, ** matches directories recursively")
+    parser.add_argument("--plugin", action="append", default=[], dest="plugins", help="name of a plugin to run, can be repeated")
+    parser.add_argument("--write", action="store_true", help="save files the plugins changed")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--output", help="file the JSON report is written to instead of standard output")
+    parser.add_argument("--files", action="store_true", help="include the report of every file")
+    args = parser.parse_args(argv)
+
+    paths = expand(args.patterns)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        chunksize = max(1, len(paths) // (4 * max(1, args.jobs)))
+        reports = list(pool.map(processFile, paths, [args.plugins] * len(paths), [args.write] * len(paths), chunksize=chunksize))
+
+    summary = aggregate(reports)
+    summary["totals"]["wallSeconds"] = time.perf_counter() - started
+    summary["errors"] = {report["path"]: report["error"] for report in reports if report["error"] is not None}
+    if args.files:
+        summary["files"] = reports
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    return 1 if summary["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,14 @@
 import tkinter
-from textEditorModel import TextEditorModel
 from textEditor import TextEditor
+from DocumentManager import DocumentManager
 
 def main():
     root = tkinter.Tk()
     root.title("Text Editor")
 
-    model = TextEditorModel("Ab ovo.\nAd astra.\nCarpe diem!\nDictum, factum.\nHomo homini lupus est.\nAlea iacta est!\nPro domo!")
-    editor = TextEditor(model, root, width=400, height=400, bg="#e6fffa")
+    documents = DocumentManager()
+    model = documents.activate(documents.new("Ab ovo.\nAd astra.\nCarpe diem!\nDictum, factum.\nHomo homini lupus est.\nAlea iacta est!\nPro domo!"))
+    editor = TextEditor(model, root, documents=documents, width=400, height=400, bg="#e6fffa")
 
     editor.show()
     editor.cursorToEnd()
@@ -1,18 +1,59 @@
+import os
+import time
+from bisect import bisect_right
 import tkinter
+import tkinter.font
+from tkinter import simpledialog, filedialog, messagebox
 from Location import Location
 from textEditorModel import TextEditorModel
-from Observers import CursorObserver, CursorObserverHelper
-from Plugins.PluginInterface import PluginInterface
-import os
-import importlib
-
-
-class TextEditor(tkinter.Canvas, CursorObserver):
+from Observers import CursorObserver, CursorObserverHelper, ResultObserver
+from FileSaver import FileSaver
+from PluginRunner import PluginRunner
+from PluginRegistry import PluginRegistry
+from Instrumentation import Instrumentation
+from Highlighter import Highlighter, TOKEN_COLORS, tokenizerFor
+from TextLayout import FontMetrics, TextLayout, WrapLayout
+from EditJournal import EditJournal
+from ModelServer import ModelServer
+
+
+class TextEditor(tkinter.Canvas, CursorObserver, ResultObserver):
     def __init__(self, model: TextEditorModel, master=None, **kwargs):
         #2.2
+        #only the lines inside the visible window get canvas items
+        self.virtualized = kwargs.pop("virtualized", True)
+        #long lines are wrapped to the width of the canvas
+        wrap = kwargs.pop("wrap", False)
+        #documents shown in tabs, they share the plugins and the clipboard
+        self.documents = kwargs.pop("documents", None)
+        #model changes are drawn at most maxFps times a second, once per frame
+        self.maxFps = kwargs.pop("maxFps", 60)
+        self.frameJob = None
+        self.lastFrame = 0
+        self.textDirty = False
+        self.cursorDirty = False
+        #line changes since the last frame, None means the whole view is redrawn
+        self.pendingChanges = []
+        #key presses not yet applied to the model
+        self.pendingInput = []
+        self.inputJob = None
+        #the first visible row, rows are lines unless lines are wrapped
+        self.scrollOffset = 0
+        #canvas items of the visible lines and selection rectangles, keyed by line index
+        self.lineItems = {}
+        self.selectionItems = {}
+        #tokens for syntax highlighting, None shows plain text
+        self.highlighter = None
+        self.highlightJob = None
         super().__init__(master, **kwargs)
         self.model = model
         self.focus_set()
+
+        #x of every column and the height of a line come from the measured font
+        self.font = tkinter.font.Font(root=self.master, family="Courier", size=15)
+        self.layout = TextLayout(self.model, FontMetrics.forFont(self.font))
+        #visual rows of the wrapped lines, None while lines are not wrapped
+        self.wrap = WrapLayout(self.model, self.layout, self.wrapWidth()) if wrap else None
     
         #2.4
         self.model.addCursorObserver(self)
@@ -25,60 +66,93 @@ class TextEditor(tkinter.Canvas, CursorObserver):
         self.model.addTextObserver(self)
     
         #2.11
-        self.plugins = self.loadPlugin()
+        self.plugins = self.documents.plugins if self.documents is not None else self.loadPlugin()
+        self.pluginRunner = None
+        self.model.addResultObserver(self)
+
+        #latency measurements, only attached while enabled in the Debug menu
+        self.instrumentation = None
+        #server for scripted editing, only running while enabled in the Debug menu
+        self.server = None
+        self.serverJob = None
 
         #2.9
         self.menu()
         self.toolbar()
         self.model.addSelectionObserver(self)
+        if self.documents is not None:
+            self.tabBar()
 
         #2.10
         self.statusBar = tkinter.Label(master, text="Line: 1, Column: 1", bd=1, relief=tkinter.SUNKEN, anchor=tkinter.W)
+
+        #saving on a worker thread, optionally on a timer, tabs start with the path of their document
+        self.path = self.documents.active.path if self.documents is not None else "text.txt"
+        self.saver = None
+        self.savedVersion = self.model.version
+        self.autosaveInterval = None
+        #journal of the model being saved, it is checkpointed when the save finishes
+        self.savingJournal = None
+        #document of the tab being saved, None without tabs
+        self.savingDocument = None
+        #buffered journal entries are written when no edit came to write them
+        self.journalJob = self.after(250, self.syncJournal)
         
         #close the window using Alt+F4
         self.bind("<Alt-F4>", lambda e: self.closeWindow())
 
         #2.4
-        self.bind("<Left>", lambda e: self.model.moveCursorLeft())
-        self.bind("<Right>", lambda e: self.model.moveCursorRight())
-        self.bind("<Up>", lambda e: self.model.moveCursorUp())
-        self.bind("<Down>", lambda e: self.model.moveCursorDown())
+        self.bind("<Left>", lambda e: self.queueInput(self.model.moveCursorLeft))
+        self.bind("<Right>", lambda e: self.queueInput(self.model.moveCursorRight))
+        self.bind("<Up>", lambda e: self.queueInput(lambda: self.moveCursorRow(-1)))
+        self.bind("<Down>", lambda e: self.queueInput(lambda: self.moveCursorRow(1)))
+
+        #scrolling the visible window
+        self.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.bind("<Button-5>", lambda e: self.scroll(3))
+        self.bind("<Prior>", lambda e: self.scroll(-self.pageSize()))
+        self.bind("<Next>", lambda e: self.scroll(self.pageSize()))
+
+        #placing the cursor and selecting with the mouse
+        self.bind("<Button-1>", lambda e: self.queueInput(lambda: self.click(e.x, e.y)))
+        self.bind("<Shift-Button-1>", lambda e: self.queueInput(lambda: self.model.extendSelection(self.locationAt(e.x, e.y))))
+        self.bind("<B1-Motion>", lambda e: self.queueInput(lambda: self.model.extendSelection(self.locationAt(e.x, e.y))))
+
+        #wrapped lines follow the width of the canvas
+        self.bind("<Configure>", lambda e: self.resized(e.width))
 
         #2.5
-        self.bind("<BackSpace>", lambda e: self.model.deleteBefore())
-        self.bind("<Delete>", lambda e: self.model.deleteAfter())
+        self.bind("<BackSpace>", lambda e: self.queueInput(self.model.deleteBefore))
+        self.bind("<Delete>", lambda e: self.queueInput(self.model.deleteAfter))
 
-        self.bind('<Shift-Left>', lambda e: self.model.selectionRangeLeft())
-        self.bind('<Shift-Right>', lambda e: self.model.selectionRangeRight())
-        self.bind('<Shift-Up>', lambda e: self.model.selectionRangeUp())
-        self.bind('<Shift-Down>', lambda e: self.model.selectionRangeDown())
+        self.bind('<Shift-Left>', lambda e: self.queueInput(self.model.selectionRangeLeft))
+        self.bind('<Shift-Right>', lambda e: self.queueInput(self.model.selectionRangeRight))
+        self.bind('<Shift-Up>', lambda e: self.queueInput(lambda: self.moveCursorRow(-1, extend=True)))
+        self.bind('<Shift-Down>', lambda e: self.queueInput(lambda: self.moveCursorRow(1, extend=True)))
+
+        #multiple cursors
+        self.bind('<Control-Alt-Up>', lambda e: self.queueInput(lambda: self.addCursorNextTo(-1)))
+        self.bind('<Control-Alt-Down>', lambda e: self.queueInput(lambda: self.addCursorNextTo(1)))
+        self.bind('<Escape>', lambda e: self.queueInput(self.model.clearCursors))
 
         #2.6
         self.bind('<Key>', lambda e: self.keyPressed(e.char))
         
         #2.7
-        self.bind('<Control-c>', lambda e: self.model.copySelection())
-        self.bind('<Control-x>', lambda e: self.model.cutSelection())
-        self.bind('<Control-v>', lambda e: self.model.paste())
-        self.bind('<Control-Shift-V>', lambda e: self.model.pasteAndRemove())
+        self.bind('<Control-c>', lambda e: self.queueInput(self.model.copySelection))
+        self.bind('<Control-x>', lambda e: self.queueInput(self.model.cutSelection))
+        self.bind('<Control-v>', lambda e: self.queueInput(self.model.paste))
+        self.bind('<Control-Shift-V>', lambda e: self.queueInput(self.model.pasteAndRemove))
 
         #2.8
-        self.bind('<Control-z>', lambda e: self.undo())
-        self.bind('<Control-y>', lambda e: self.redo())
+        self.bind('<Control-z>', lambda e: self.queueInput(self.undo))
+        self.bind('<Control-y>', lambda e: self.queueInput(self.redo))
 
     #2.11
     def loadPlugin(self):
-        plugins = []
-        for file in os.listdir("Plugins"):
-            if file.endswith(".py"):
-                plugin_name = file[:-3]
-                spec = importlib.util.spec_from_file_location(plugin_name, os.path.join("Plugins", file))
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
-                for name, obj in module.__dict__.items():
-                    if isinstance(obj, type) and issubclass(obj, PluginInterface) and obj is not PluginInterface:
-                        plugins.append(obj())
-        return plugins
+        #the menu is built from the manifest, a plugin module is imported when it is first run
+        return PluginRegistry().discover()
         
     #2.9
     def menu(self):
@@ -88,6 +162,10 @@ class TextEditor(tkinter.Canvas, CursorObserver):
         #File menu
         self.file_menu = tkinter.Menu(self.menu, tearoff=0)
         self.file_menu.add_command(label="Open", command=self.openFile)
+        if self.documents is not None:
+            self.file_menu.add_command(label="New tab", command=self.newTab)
+            self.file_menu.add_command(label="Open in new tab", command=self.openTab)
+            self.file_menu.add_command(label="Close tab", command=lambda: self.closeTab(self.documents.active))
         self.file_menu.add_command(label="Save", command=self.save)
         self.file_menu.add_command(label="Exit", command=self.closeWindow)
         self.menu.add_cascade(label="File", menu=self.file_menu)
@@ -96,12 +174,14 @@ class TextEditor(tkinter.Canvas, CursorObserver):
         self.edit_menu = tkinter.Menu(self.menu, tearoff=0)
         self.edit_menu.add_command(label="Undo", command=self.undo)
         self.edit_menu.add_command(label="Redo", command=self.redo)
-        self.edit_menu.add_command(label="Cut", command=self.model.cutSelection, state='disabled')
-        self.edit_menu.add_command(label="Copy", command=self.model.copySelection, state='disabled')
-        self.edit_menu.add_command(label="Paste", command=self.model.paste, state='disabled')
-        self.edit_menu.add_command(label="Paste and Take", command=self.model.pasteAndRemove, state='disabled')
+        self.edit_menu.add_command(label="Cut", command=lambda: self.model.cutSelection(), state='disabled')
+        self.edit_menu.add_command(label="Copy", command=lambda: self.model.copySelection(), state='disabled')
+        self.edit_menu.add_command(label="Paste", command=lambda: self.model.paste(), state='disabled')
+        self.edit_menu.add_command(label="Paste and Take", command=lambda: self.model.pasteAndRemove(), state='disabled')
         self.edit_menu.add_command(label="Delete selection", command=self.deleteSelection)
         self.edit_menu.add_command(label="Clear document", command=self.clearDocument)
+        self.edit_menu.add_command(label="Find next", command=self.findNext)
+        self.edit_menu.add_command(label="Replace all", command=self.replaceAll)
         self.menu.add_cascade(label="Edit", menu=self.edit_menu)
 
         # Move menu
@@ -110,13 +190,89 @@ class TextEditor(tkinter.Canvas, CursorObserver):
         self.move_menu.add_command(label="Cursor to document end", command=self.cursorToEnd)
         self.menu.add_cascade(label="Move", menu=self.move_menu)
 
+        # View menu
+        self.view_menu = tkinter.Menu(self.menu, tearoff=0)
+        self.wrapEnabled = tkinter.BooleanVar(master=self.master, value=self.wrap is not None)
+        self.view_menu.add_checkbutton(label="Word wrap", variable=self.wrapEnabled, command=lambda: self.setWrap(self.wrapEnabled.get()))
+        self.menu.add_cascade(label="View", menu=self.view_menu)
+
         # Plugins menu
         #2.11
         self.plugins_menu = tkinter.Menu(self.menu, tearoff=0)
         for plugin in self.plugins:
-            self.plugins_menu.add_command(label=plugin.getName(), command=lambda plugin=plugin: plugin.execute(self.model, None))
+            self.plugins_menu.add_command(label=plugin.getName(), command=lambda plugin=plugin: self.runPlugin(plugin.load()))
         self.menu.add_cascade(label="Plugins", menu=self.plugins_menu)
 
+        # Debug menu
+        self.debug_menu = tkinter.Menu(self.menu, tearoff=0)
+        self.instrumentationEnabled = tkinter.BooleanVar(master=self.master, value=False)
+        self.debug_menu.add_checkbutton(label="Measure latency", variable=self.instrumentationEnabled, command=self.toggleInstrumentation)
+        self.debug_menu.add_command(label="Export timings", command=self.exportTimings)
+        self.serverEnabled = tkinter.BooleanVar(master=self.master, value=False)
+        self.debug_menu.add_checkbutton(label="Scripting server", variable=self.serverEnabled, command=self.toggleServer)
+        if self.documents is not None:
+            self.debug_menu.add_command(label="Document memory", command=self.showDocumentMemory)
+        self.menu.add_cascade(label="Debug", menu=self.debug_menu)
+
+    def toggleInstrumentation(self):
+        if self.instrumentationEnabled.get():
+            self.instrumentation = Instrumentation()
+            self.instrumentation.attach(self.model, self)
+        elif self.instrumentation is not None:
+            self.instrumentation.detach()
+            self.instrumentation = None
+        self.updateCursorLocation(self.model.cursorLocation)
+
+    def toggleServer(self):
+        if self.serverEnabled.get():
+            self.server = ModelServer(self.model, path=ModelServer.defaultPath(), fps=self.maxFps)
+            self.statusBar.config(text=f"Scripting server listening on {self.server.start()}")
+            self.pollServer()
+        elif self.server is not None:
+            self.after_cancel(self.serverJob)
+            self.server.stop()
+            self.server = self.serverJob = None
+
+    #what clients sent since the last frame is applied as one edit
+    def pollServer(self):
+        #scheduled first, a request that fails must not stop the server
+        self.serverJob = self.after(max(1, int(1000 / self.maxFps)), self.pollServer)
+        self.server.applyPending()
+
+    def exportTimings(self):
+        if self.instrumentation is None:
+            self.statusBar.config(text="Latency measurement is off, enable it in the Debug menu")
+            return
+        path = filedialog.asksaveasfilename(parent=self.master, defaultextension=".json", initialfile="timings.json")
+        if path:
+            self.instrumentation.export(path)
+
+    def runPlugin(self, plugin):
+        #line transforms run off the Tk thread, the changed lines come back as one edit
+        if plugin.isLineTransform():
+            if self.pluginRunner is None or self.pluginRunner.status != "running":
+                self.pluginRunner = PluginRunner(self.model, plugin)
+                self.pluginRunner.start()
+                self.pollPlugin()
+            return
+
+        #the whole plugin run is one edit, so the view is redrawn once at the end
+        with self.model.edit():
+            plugin.execute(self.model, self.model.clipboard)
+
+    def pluginResult(self, title, message, data):
+        messagebox.showinfo(title, message)
+
+    def pollPlugin(self):
+        runner = self.pluginRunner
+        if runner.poll():
+            self.statusBar.config(text=f"{runner.plugin.getName()}: {runner.linesDone * 100 // runner.total()}%")
+            self.after(50, self.pollPlugin)
+        elif runner.status == "stale":
+            self.statusBar.config(text=f"{runner.plugin.getName()} was cancelled because the text changed while it was running")
+        elif runner.status == "failed":
+            self.statusBar.config(text=f"{runner.plugin.getName()} failed: {runner.error}")
+
     def selectionChanged(self):
         # Ako postoji selekcija, omogući Cut i Copy
         if self.model.getSelectionRange():
@@ -151,23 +307,230 @@ class TextEditor(tkinter.Canvas, CursorObserver):
         self.undoButton.pack(side="left")
         self.redoButton = tkinter.Button(self.toolbar, text='Redo', command=self.redo)
         self.redoButton.pack(side="left")
-        self.cutButton = tkinter.Button(self.toolbar, text='Cut', command=self.model.cutSelection, state='disabled')
+        self.cutButton = tkinter.Button(self.toolbar, text='Cut', command=lambda: self.model.cutSelection(), state='disabled')
         self.cutButton.pack(side="left")
-        self.copyButton = tkinter.Button(self.toolbar, text='Copy', command=self.model.copySelection, state='disabled')
+        self.copyButton = tkinter.Button(self.toolbar, text='Copy', command=lambda: self.model.copySelection(), state='disabled')
         self.copyButton.pack(side="left")
-        self.pasteButton = tkinter.Button(self.toolbar, text='Paste', command=self.model.paste, state='disabled')
+        self.pasteButton = tkinter.Button(self.toolbar, text='Paste', command=lambda: self.model.paste(), state='disabled')
         self.pasteButton.pack(side="left")
 
         self.toolbar.pack(side="top")
 
-    def openFile(self):
-        with open("text.txt", "r") as file:
-            self.model.setText(file.read())
-            self.cursorToEnd()
+    def tabBar(self):
+        self.tabs = tkinter.Frame(self.master)
+        self.activeTab = tkinter.IntVar(master=self.master, value=0)
+        self.refreshTabs()
+        self.tabs.pack(side="top", fill=tkinter.X)
+
+    def refreshTabs(self):
+        for button in self.tabs.winfo_children():
+            button.destroy()
+        for index, document in enumerate(self.documents.documents):
+            name = document.getName() + (" *" if document.isModified() else "")
+            tkinter.Radiobutton(self.tabs, text=name, indicatoron=False, variable=self.activeTab, value=index,
+                                command=lambda document=document: self.switchTo(document)).pack(side="left")
+        self.activeTab.set(self.documents.documents.index(self.documents.active))
+
+    def newTab(self):
+        self.switchTo(self.documents.new())
+
+    def openTab(self, path=None):
+        path = path or filedialog.askopenfilename(parent=self.master)
+        if path:
+            self.switchTo(self.documents.open(path))
+
+    def closeTab(self, document):
+        if document.isModified() and not messagebox.askyesno("Close tab", f"{document.getName()} has unsaved changes. Close it anyway?"):
+            return
+        if document is self.documents.active:
+            #the state of the closed document is not kept
+            document.savedVersion = self.savedVersion
+        following = self.documents.close(document)
+        if following is not None:
+            self.showDocument(following)
+        self.refreshTabs()
+
+    def switchTo(self, document):
+        if document is not self.documents.active:
+            #only what is needed to show the document again is kept while it is in the background
+            active = self.documents.active
+            active.scrollOffset = self.scrollOffset
+            active.savedVersion = self.savedVersion
+            self.showDocument(document)
+        self.refreshTabs()
+
+    def showDocument(self, document):
+        model = self.documents.activate(document)
+        #untitled documents have no path until they are saved, they never share a default one
+        self.setModel(model, document.path, document.savedVersion, document.scrollOffset)
+        self.showRecovered(document.recovered)
+        document.recovered = 0
+
+    def showDocumentMemory(self):
+        report = self.documents.memoryReport()
+        lines = [f"{document.getName()}: {size / 1024:.0f} KB" + ("" if document.isLoaded() else " (not loaded)") for document, size in report]
+        messagebox.showinfo("Document memory", "\n".join(lines) or "No documents in the background")
+
+    #shows another model, the observers, layout caches and canvas items of the old one are released
+    def setModel(self, model, path="text.txt", savedVersion=None, scrollOffset=0):
+        #queued key presses still belong to the old model
+        if self.inputJob is not None:
+            self.after_cancel(self.inputJob)
+            self.flushInput()
+        for job in (self.frameJob, self.highlightJob):
+            if job is not None:
+                self.after_cancel(job)
+        self.frameJob = self.highlightJob = None
+        self.pendingChanges = []
+        self.textDirty = self.cursorDirty = False
+        if self.instrumentation is not None:
+            self.instrumentation.detach()
+
+        old = self.model
+        if old.journal is not None:
+            old.journal.sync()
+        old.removeCursorObserver(self)
+        old.removeCursorObserver(self.cursorObserverHelper)
+        old.removeTextObserver(self)
+        old.removeResultObserver(self)
+        old.removeSelectionObserver(self)
+        for cache in (self.layout, self.wrap, self.highlighter):
+            if cache is not None:
+                cache.detach()
 
-    def save(self):
-        with open("text.txt", "w") as file:
-            file.write(self.model.getText())
+        self.model = model
+        model.addCursorObserver(self)
+        model.addCursorObserver(self.cursorObserverHelper)
+        model.addTextObserver(self)
+        model.addResultObserver(self)
+        model.addSelectionObserver(self)
+        self.layout = TextLayout(model, self.layout.metrics)
+        if self.wrap is not None:
+            self.wrap = WrapLayout(model, self.layout, self.wrapWidth())
+        self.highlighter = None
+        if self.instrumentation is not None:
+            self.instrumentation.attach(model, self)
+        if self.server is not None:
+            self.server.setModel(model)
+
+        self.path = path
+        self.savedVersion = model.version if savedVersion is None else savedVersion
+        self.scrollOffset = scrollOffset
+        self.setTokenizer(tokenizerFor(path) if path is not None else None)
+        self.selectionChanged()
+        self.updateCursorLocation(model.cursorLocation)
+        self.pollLoading()
+
+    def openFile(self, path=None):
+        path = path or self.path or filedialog.askopenfilename(parent=self.master)
+        if not path:
+            return
+        self.path = path
+        self.model.openFile(self.path)
+        self.savedVersion = self.model.version
+        #edits left in the journal by a session that did not save them are applied again
+        _, recovered = EditJournal.attach(self.model, self.path)
+        self.showRecovered(recovered)
+        if self.documents is not None:
+            self.documents.active.path = os.path.abspath(self.path)
+            self.refreshTabs()
+        self.setTokenizer(tokenizerFor(self.path))
+        self.pollLoading()
+
+    #highlights the text with the tokenizer, None turns highlighting off
+    def setTokenizer(self, tokenizer):
+        if self.highlighter is not None:
+            self.highlighter.detach()
+        if self.highlightJob is not None:
+            self.after_cancel(self.highlightJob)
+            self.highlightJob = None
+        self.highlighter = Highlighter(self.model, tokenizer) if tokenizer is not None else None
+        self.redraw()
+
+    #tokenizes up to a page below the visible window, for at most a few milliseconds
+    #at a time so that long files are tokenized in idle time between frames.
+    #Returns the range of lines whose tokens changed or None.
+    def highlight(self, budget=0.005):
+        if self.highlighter is None:
+            return None
+        top, bottom = self.visibleLines()
+        limit = bottom + self.pageSize()
+        tokenized = self.highlighter.advance(limit, time.perf_counter() + budget)
+        if self.highlighter.frontier < min(limit, len(self.model.lines)) and self.highlightJob is None:
+            self.highlightJob = self.after(1, self.highlightInBackground)
+        return tokenized
+
+    def highlightInBackground(self):
+        self.highlightJob = None
+        tokenized = self.highlight(budget=0.02)
+        if tokenized is not None:
+            top, bottom = self.visibleLines()
+            for line in range(max(tokenized[0], top), min(tokenized[1], bottom)):
+                if line in self.lineItems:
+                    self.drawLineText(line)
+
+    #shows the lines of a large file as the background indexer finds them
+    def pollLoading(self):
+        if self.model.syncLoading():
+            self.after(100, self.pollLoading)
+
+    def save(self, path=None):
+        if self.saver is not None and not self.saver.done:
+            return
+        #an untitled document is saved under a name the user picks
+        path = path or self.path or filedialog.asksaveasfilename(parent=self.master, defaultextension=".txt")
+        if not path:
+            return
+        self.path = path
+        self.saver = FileSaver(self.model, self.path)
+        self.savingDocument = self.documents.active if self.documents is not None else None
+        self.savingJournal = self.model.journal
+        if self.savingJournal is not None:
+            self.savingJournal.beginSave()
+        self.saver.addObserver(self)
+        self.saver.start()
+        self.pollSaving()
+
+    def pollSaving(self):
+        if self.saver.poll():
+            self.after(50, self.pollSaving)
+
+    def saveProgress(self, written, total):
+        self.statusBar.config(text=f"Saving {self.path}: {written * 100 // max(total, 1)}%")
+
+    def saveFinished(self, path, error):
+        journal, self.savingJournal = self.savingJournal, None
+        if journal is not None:
+            #the saved file is the new checkpoint of the journal if it is the journaled file
+            journal.endSave(path if error is None and EditJournal.pathFor(path) == journal.path else None)
+        document, self.savingDocument = self.savingDocument, None
+        if error is None:
+            if document is not None:
+                #the editor may show another document by the time the save finishes
+                document.path = os.path.abspath(path)
+                document.savedVersion = self.saver.version
+                if document is self.documents.active:
+                    self.savedVersion = self.saver.version
+                self.refreshTabs()
+            elif path == self.path:
+                self.savedVersion = self.saver.version
+            self.statusBar.config(text=f"Saved {path}")
+        else:
+            self.statusBar.config(text=f"Saving {path} failed: {error}")
+
+    #saves every interval seconds when the text changed, None turns autosave off
+    def setAutosave(self, interval):
+        self.autosaveInterval = interval
+        if interval is not None:
+            self.after(int(interval * 1000), self.autosave)
+
+    def autosave(self):
+        if self.autosaveInterval is None:
+            return
+        #untitled documents are not autosaved, that would open a file dialog on a timer
+        if self.model.version != self.savedVersion and self.path is not None:
+            self.save()
+        self.after(int(self.autosaveInterval * 1000), self.autosave)
 
     def clearDocument(self):
         self.model.clear()
@@ -175,92 +538,479 @@ class TextEditor(tkinter.Canvas, CursorObserver):
     def deleteSelection(self):
         self.model.deleteRange(self.model.getSelectionRange())
 
+    def findNext(self):
+        query = simpledialog.askstring("Find", "Find:", initialvalue=getattr(self, "lastQuery", ""), parent=self.master)
+        if not query:
+            return
+        self.lastQuery = query
+        found = self.model.search.findNext(query, self.model.cursorLocation)
+        if found is None:
+            self.statusBar.config(text=f"{query} not found")
+            return
+        with self.model.edit():
+            self.model.cursorLocation = found.end
+            self.model.setSelectionRange(found)
+            self.model.notifyCursorObservers()
+
+    def replaceAll(self):
+        query = simpledialog.askstring("Replace all", "Find:", parent=self.master)
+        if not query:
+            return
+        replacement = simpledialog.askstring("Replace all", "Replace with:", parent=self.master)
+        if replacement is None:
+            return
+        count = self.model.search.replaceAll(query, replacement)
+        self.statusBar.config(text=f"Replaced {count} occurrences of {query}")
+
     def closeWindow(self):
+        for job in (self.inputJob, self.frameJob, self.highlightJob, self.journalJob, self.serverJob):
+            if job is not None:
+                self.after_cancel(job)
+        if self.server is not None:
+            self.server.stop()
+        #unsaved edits stay in the journals and are recovered when the files are opened again
+        models = [document.model for document in self.documents.documents if document.isLoaded()] if self.documents is not None else [self.model]
+        for model in models:
+            if model.journal is not None:
+                model.journal.close()
         self.master.destroy()
 
+    def syncJournal(self):
+        journal = self.model.journal
+        if journal is not None and time.monotonic() - journal.lastSync >= journal.syncInterval:
+            journal.sync()
+        self.journalJob = self.after(250, self.syncJournal)
+
+    def showRecovered(self, count):
+        if count:
+            messagebox.showinfo("Recovered edits", f"{count} unsaved edits of {os.path.basename(self.path)} were recovered from its journal.")
+
     def cursorToStart(self):
         self.model.cursorLocation = Location(0, 0)
         self.model.selectionRange = None
-        self.drawCursor(self.model.cursorLocation)
+        self.updateCursorLocation(self.model.cursorLocation)
 
     def cursorToEnd(self):
         self.model.cursorLocation = Location(len(self.model.lines[-1]), len(self.model.lines) - 1)
         self.model.selectionRange = None
-        self.drawCursor(self.model.cursorLocation)
+        self.updateCursorLocation(self.model.cursorLocation)
+
+    def pageSize(self):
+        height = self.winfo_height() if self.winfo_height() > 1 else int(self.cget("height"))
+        return max(1, (height - 10) // self.layout.lineHeight)
+
+    def visibleLines(self):
+        #returns the range of model lines that fit on the canvas
+        if not self.virtualized:
+            return 0, len(self.model.lines)
+        if self.wrap is None:
+            return self.scrollOffset, min(self.scrollOffset + self.pageSize() + 1, len(self.model.lines))
+        #the lines are wrapped here as they come into view
+        top, _ = self.wrap.lineAtRow(self.scrollOffset)
+        row = self.wrap.rowOfLine(top)
+        end = self.scrollOffset + self.pageSize() + 1
+        bottom = top
+        while bottom < len(self.model.lines) and row < end:
+            row += len(self.wrap.rows(bottom))
+            bottom += 1
+        return top, bottom
+
+    def rowCount(self):
+        return self.wrap.rowOfLine(len(self.model.lines)) if self.wrap is not None else len(self.model.lines)
+
+    def rowOf(self, line, column=0):
+        if self.wrap is None:
+            return line
+        return self.wrap.rowOfLine(line) + self.wrap.rowWithin(line, column)
+
+    def scroll(self, rows):
+        if not self.virtualized:
+            return
+        offset = max(0, min(self.scrollOffset + rows, self.rowCount() - 1))
+        if offset != self.scrollOffset:
+            self.scrollOffset = offset
+            self.redraw()
+
+    def ensureVisible(self, line, column=0):
+        #moves the visible window so that the row of the location is inside it, returns True if it moved
+        if not self.virtualized:
+            return False
+        row = self.rowOf(line, column)
+        if row < self.scrollOffset:
+            self.scrollOffset = row
+        elif row >= self.scrollOffset + self.pageSize():
+            self.scrollOffset = row - self.pageSize() + 1
+        else:
+            return False
+        return True
+
+    def wrapWidth(self):
+        width = self.winfo_width() if self.winfo_width() > 1 else int(self.cget("width"))
+        return max(1, width - 20)
+
+    def setWrap(self, enabled):
+        if enabled == (self.wrap is not None):
+            return
+        #the line at the top stays at the top
+        top, _ = self.visibleLines()
+        if enabled:
+            self.wrap = WrapLayout(self.model, self.layout, self.wrapWidth())
+        else:
+            self.wrap.detach()
+            self.wrap = None
+        self.scrollOffset = self.rowOf(top) if self.virtualized else 0
+        self.redraw()
+
+    def resized(self, width):
+        if self.wrap is not None and self.wrap.width != max(1, width - 20):
+            top, _ = self.visibleLines()
+            #only the lines that are shown are wrapped again
+            self.wrap.setWidth(max(1, width - 20))
+            self.scrollOffset = self.rowOf(top) if self.virtualized else 0
+            self.redraw()
+
+    #moves the cursor to the row above or below, the visual row when lines are wrapped
+    def moveCursorRow(self, direction, extend=False):
+        if self.wrap is None or self.model.multipleCursors():
+            if extend:
+                self.model.selectionRangeUp() if direction < 0 else self.model.selectionRangeDown()
+            else:
+                self.model.moveCursorUp() if direction < 0 else self.model.moveCursorDown()
+            return
+        location = self.model.cursorLocation
+        row = self.rowOf(location.y, location.x) + direction
+        if not 0 <= row < self.rowCount():
+            return
+        x, _ = self.place(location.y, location.x)
+        target = self.locationAtRow(row, x - 10)
+        with self.model.edit():
+            if extend:
+                self.model.extendSelection(target)
+            else:
+                self.model.cursorLocation = target
+                self.model.setSelectionRange(None)
+                self.model.notifyCursorObservers()
     
     #2.8
     def undo(self):
-        pass
+        self.model.undo()
 
     def redo(self):
-        pass
+        self.model.redo()
     
     #2.6
     def keyPressed(self, char):
         if char:
             if char.isalnum() or char in ".,;:?!-()[]{} ":
-                self.model.insert(char)
+                self.queueInput(text=char)
             elif char == "\r" or char == "\n":
-                self.model.insert("\n")
+                self.queueInput(text="\n")
         else:
             pass
 
+    #key presses are queued and applied when Tk has handled the events waiting in its
+    #queue, so a burst of auto-repeat or fast typing becomes one edit of the model.
+    #Typed characters in a row are joined into one insert, other keys run in order.
+    def queueInput(self, action=None, text=None):
+        if text is not None and self.pendingInput and isinstance(self.pendingInput[-1], str):
+            self.pendingInput[-1] += text
+        else:
+            self.pendingInput.append(text if text is not None else action)
+        if self.inputJob is None:
+            self.inputJob = self.after_idle(self.flushInput)
+
+    def flushInput(self):
+        self.inputJob = None
+        pending, self.pendingInput = self.pendingInput, []
+        if not pending:
+            return
+        #every key press is its own undo step like without coalescing, so typing merges
+        #the same way and undo and redo see the steps of the keys pressed before them
+        with self.model.edit():
+            for item in pending:
+                if isinstance(item, str):
+                    for char in item:
+                        self.model.splitStep()
+                        self.model.insert(char)
+                else:
+                    self.model.splitStep()
+                    item()
+
+    #repaints once per frame, never sooner than 1 / maxFps seconds after the last one
+    def scheduleFrame(self):
+        if self.frameJob is not None:
+            return
+        delay = self.lastFrame + 1 / self.maxFps - time.perf_counter()
+        if delay > 0:
+            self.frameJob = self.after(max(1, int(delay * 1000)), self.renderFrame)
+        else:
+            self.frameJob = self.after_idle(self.renderFrame)
+
+    def renderFrame(self):
+        self.frameJob = None
+        self.lastFrame = time.perf_counter()
+        if self.textDirty:
+            self.textDirty = False
+            changes, self.pendingChanges = self.pendingChanges, []
+            self.applyChanges(changes)
+        if self.cursorDirty:
+            self.cursorDirty = False
+            self.showCursor(self.model.cursorLocation)
+
     #2.5
-    def updateText(self):
+    def updateText(self, changes=None):
+        if changes is None or self.pendingChanges is None:
+            self.pendingChanges = None
+        else:
+            self.pendingChanges.extend(changes)
+        self.textDirty = True
+        self.scheduleFrame()
+
+    def applyChanges(self, changes):
+        if changes is None or self.wrap is not None and self.rowsMoved(changes):
+            self.redraw()
+            return
+
+        #lines whose text has to be refreshed, in the numbering after the changes
+        dirty = set()
+        for change in changes:
+            delta = change.inserted - change.removed
+            kept = change.start + min(change.removed, change.inserted)
+            if delta != 0:
+                #items of removed lines are dropped and items below the change move with their lines
+                items = {}
+                for line, item in self.lineItems.items():
+                    if line < kept:
+                        items[line] = item
+                    elif line >= change.start + change.removed:
+                        items[line + delta] = item
+                        self.move(item, 0, delta * self.layout.lineHeight)
+                        self.move(f"tokens{item}", 0, delta * self.layout.lineHeight)
+                    else:
+                        self.deleteLineItem(item)
+                self.lineItems = items
+                dirty = {line if line < kept else line + delta for line in dirty if line < kept or line >= change.start + change.removed}
+            dirty.update(line for line in self.lineItems if change.start <= line < kept)
+
+        #an edit can change the tokens of the lines below it, e.g. by opening a string
+        tokenized = self.highlight()
+        if tokenized is not None:
+            dirty.update(range(*tokenized))
+
+        top, bottom = self.visibleLines()
+        for line in dirty:
+            if line in self.lineItems and top <= line < bottom:
+                self.drawLineText(line)
+        self.drawLines()
+        self.drawSelection()
+
+    #True when wrapped lines below the changes moved to other rows
+    def rowsMoved(self, changes):
+        if any(change.inserted != change.removed for change in changes):
+            return True
+        self.wrap.rowsChanged = False
+        top, bottom = self.visibleLines()
+        for change in changes:
+            for line in range(max(change.start, top), min(change.start + change.inserted, bottom)):
+                self.wrap.rows(line)
+        return self.wrap.rowsChanged
+
+    def redraw(self):
         self.delete("all")
+        self.lineItems = {}
+        self.selectionItems = {}
         self.show()
+        self.drawCursor(self.model.cursorLocation)
 
     #2.4
     def updateCursorLocation(self, loc):
+        self.cursorDirty = True
+        self.scheduleFrame()
+
+    def showCursor(self, loc):
+        if self.ensureVisible(loc.y, loc.x):
+            self.redraw()
         self.drawCursor(loc)
 
         #2.10
-        self.statusBar.config(text=f"Ln: {loc.y + 1}, Col: {loc.x + 1}, Number of lines: {len(self.model.lines)}")
+        status = f"Ln: {loc.y + 1}, Col: {loc.x + 1}, Number of lines: {len(self.model.lines)}"
+        #word and character counts of a mapped file are only shown once something asked for them
+        if self.model.statistics.ready:
+            lines, words, characters = self.model.getStatistics()
+            status += f", Words: {words}, Characters: {characters}"
+        if self.instrumentation is not None:
+            status += ", " + self.instrumentation.summary()
+        self.statusBar.config(text=status)
+
+    #adds a cursor on the line above the topmost or below the lowest cursor
+    def addCursorNextTo(self, direction):
+        rows = [location.y for location, _ in self.model.getCursors()]
+        y = min(rows) - 1 if direction < 0 else max(rows) + 1
+        if 0 <= y < len(self.model.lines):
+            self.model.addCursor(Location(min(self.model.cursorLocation.x, len(self.model.lines[y])), y))
+            if self.ensureVisible(y):
+                self.redraw()
 
     def drawCursor(self, location):
         self.delete("cursor")
 
-        x = 10 + location.x * 12    #width of a character
-        y = 10 + location.y * 20    #height of a character
+        top, bottom = self.visibleLines()
+        for location in [location] + [extra for extra, _ in self.model.getCursors()[1:]]:
+            if not top <= location.y < bottom:
+                continue
 
-        self.create_rectangle(x, y, x+1, y+20, fill="black", tag="cursor")
+            x, y = self.place(location.y, location.x)
+
+            self.create_rectangle(x, y, x+1, y + self.layout.lineHeight, fill="black", tag="cursor")
     
     def blink_cursor(self):
         self.cursor_visible = not self.cursor_visible
         self.drawCursor(self.model.cursorLocation) if self.cursor_visible else self.delete("cursor")
         self.after(500, self.blink_cursor)
     
+    def lineY(self, line):
+        return 10 + (self.rowOf(line) - self.scrollOffset) * self.layout.lineHeight
+
+    #the top left corner of a column on the canvas
+    def place(self, line, column):
+        if self.wrap is None:
+            return 10 + self.layout.columnToX(line, column), self.lineY(line)
+        breaks = self.wrap.rows(line)
+        row = bisect_right(breaks, column) - 1
+        return (10 + self.layout.columnToX(line, column) - self.layout.columnToX(line, breaks[row]),
+                self.lineY(line) + row * self.layout.lineHeight)
+
+    #the location of the column boundary nearest to a point on the canvas
+    def locationAt(self, x, y):
+        row = self.scrollOffset + (y - 10) // self.layout.lineHeight
+        return self.locationAtRow(min(max(row, 0), self.rowCount() - 1), x - 10)
+
+    def locationAtRow(self, row, x):
+        if self.wrap is None:
+            return Location(self.layout.xToColumn(row, x), row)
+        line, row = self.wrap.lineAtRow(row)
+        breaks = self.wrap.rows(line)
+        row = min(row, len(breaks) - 1)
+        start = breaks[row]
+        #a location at the end of a row that is not the last one would be shown at the start of the next
+        end = breaks[row + 1] - 1 if row + 1 < len(breaks) else len(self.model.lines[line])
+        column = self.layout.xToColumn(line, x + self.layout.columnToX(line, start))
+        return Location(min(max(column, start), end), line)
+
+    def click(self, x, y):
+        self.focus_set()
+        with self.model.edit():
+            self.model.clearCursors()
+            self.model.cursorLocation = self.locationAt(x, y)
+            self.model.setSelectionRange(None)
+            self.model.notifyCursorObservers()
+
+    def drawLines(self):
+        #creates items for visible lines that have none and drops items that left the window
+        top, bottom = self.visibleLines()
+        for line in [line for line in self.lineItems if not top <= line < bottom]:
+            self.deleteLineItem(self.lineItems.pop(line))
+        for line in range(top, bottom):
+            if line not in self.lineItems:
+                self.drawLineText(line)
+
+    def drawLineText(self, line):
+        #a line is drawn as runs of text placed at the x of their first column by the layout.
+        #The first run is the line's item, the others are tagged with it.
+        text = self.model.lines[line]
+        y = self.lineY(line)
+        item = self.lineItems.get(line)
+        if item is None:
+            item = self.lineItems[line] = self.create_text(10, y, anchor="nw", font=self.font, tag="text")
+        else:
+            self.delete(f"tokens{item}")
+        runs = self.textRuns(line, text) or [(0, 0, "black")]
+        start, end, color = runs[0]
+        self.coords(item, *self.place(line, start))
+        self.itemconfig(item, text=text[start:end], fill=color)
+        for start, end, color in runs[1:]:
+            self.create_text(*self.place(line, start), text=text[start:end], anchor="nw", font=self.font, fill=color, tag=("text", f"tokens{item}"))
+
+    def textRuns(self, line, text):
+        #(start, end, color) of the plain and highlighted parts of a line, split at tabs
+        #so that a tab stop is wherever the layout puts it, and at the rows of a wrapped line
+        tokens = self.highlighter.tokensAt(line) if self.highlighter is not None else None
+        spans = []
+        position = 0
+        for start, end, kind in tokens or ():
+            if kind in TOKEN_COLORS:
+                spans.append((position, start, "black"))
+                spans.append((start, end, TOKEN_COLORS[kind]))
+                position = end
+        spans.append((position, len(text), "black"))
+
+        breaks = self.wrap.rows(line)[1:] if self.wrap is not None else []
+        runs = []
+        for start, end, color in spans:
+            while start < end:
+                tab = text.find("\t", start, end)
+                stop = end if tab < 0 else tab
+                row = bisect_right(breaks, start)
+                if row < len(breaks) and breaks[row] < stop:
+                    runs.append((start, breaks[row], color))
+                    start = breaks[row]
+                    continue
+                if stop > start:
+                    runs.append((start, stop, color))
+                start = stop + 1
+        return runs
+
+    def deleteLineItem(self, item):
+        self.delete(item)
+        self.delete(f"tokens{item}")
+
+    def drawSelection(self):
+        #2.5
+        #rectangles are keyed by row and start column, several cursors may select on one row
+        rectangles = {}
+        top, bottom = self.visibleLines()
+        for location, selection in self.model.getCursors():
+            if not selection:
+                continue
+            start, end = self.model.orderedRange(location, selection)
+
+            # One rectangle per selected row, clipped to the visible window
+            for curr_row in range(max(start.y, top), min(end.y + 1, bottom)):
+                x_start = start.x if curr_row == start.y else 0
+                x_end = end.x if curr_row == end.y else len(self.model.lines[curr_row])
+                for column, (x0, y0), (x1, y1) in self.rowSpans(curr_row, x_start, x_end):
+                    rectangles[curr_row, column] = (x0, y0, x1, y0 + self.layout.lineHeight)
+
+        for row in [row for row in self.selectionItems if row not in rectangles]:
+            self.delete(self.selectionItems.pop(row))
+        for row, coords in rectangles.items():
+            if row in self.selectionItems:
+                self.coords(self.selectionItems[row], *coords)
+            else:
+                self.selectionItems[row] = self.create_rectangle(*coords, fill="grey", outline="", stipple="gray50")
+
+    def rowSpans(self, line, start, end):
+        #(first column, top left, end) of the part of columns [start, end] on each visual row
+        if self.wrap is None or start == end:
+            return [(start, self.place(line, start), self.place(line, end))]
+        breaks = self.wrap.rows(line) + [len(self.model.lines[line])]
+        spans = []
+        for row in range(bisect_right(breaks, start) - 1, len(breaks) - 1):
+            if breaks[row] >= end:
+                break
+            first, last = max(start, breaks[row]), min(end, breaks[row + 1])
+            x0, y = self.place(line, first)
+            spans.append((first, (x0, y), (x0 + self.layout.columnToX(line, last) - self.layout.columnToX(line, first), y)))
+        return spans
+
     #2.2, 2.3, 2.4, 2.5
     def show(self):
         #2.2
-        y_offset = 10
-        for line in self.model.allLines():
-            self.create_text(10, y_offset, text=line, anchor="nw", font=("Courier", 15), tag="text")
-            y_offset += 20
-
-        #2.5
-        if self.model.selectionRange:
-            start = self.model.getSelectionRange().start
-            end = self.model.getSelectionRange().end
-
-            # Normalize the selection range so that start is before end
-            if end.y < start.y or (end.y == start.y and end.x < start.x):
-                start, end = end, start
-
-            # If the selection is on a single line draw a single rectangle
-            if start.y == end.y:
-                self.create_rectangle(start.x * 12 + 10, start.y * 20 + 10, end.x * 12 + 10, (end.y + 1) * 20 + 10, fill="grey", outline="", stipple="gray50")
-            else: # If the selection spans multiple lines draw multiple rectangles
-                # First line
-                self.create_rectangle(start.x * 12 + 10, start.y * 20 + 10, len(self.model.lines[start.y]) * 12 + 10, (start.y + 1) * 20 + 10, fill="grey", outline="", stipple="gray50")
-                # Middle lines
-                for curr_row in range(start.y + 1, end.y):
-                    self.create_rectangle(10, curr_row * 20 + 10, len(self.model.lines[curr_row]) * 12 + 10, (curr_row + 1) * 20 + 10, fill="grey", outline="", stipple="gray50")
-                # Last line
-    
-                self.create_rectangle(10, end.y * 20 + 10, end.x * 12 + 10, (end.y + 1) * 20 + 10, fill="grey", outline="", stipple="gray50")
+        self.highlight()
+        self.drawLines()
+        self.drawSelection()
 
         #2.10
         self.statusBar.pack(side=tkinter.BOTTOM, fill=tkinter.X)
         #2.2
-        self.pack()
\ No newline at end of file
+        self.pack()
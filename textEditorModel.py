@@ -1,30 +1,120 @@
 from Location import Location
 from LocationRange import LocationRange
 from Iterators import AllLines, LinesRange
-from Observers import CursorObserver, TextObserver
+from Observers import CursorObserver, TextObserver, ResultObserver
+from LineChange import LineChange
 
-from copy import deepcopy
+from contextlib import contextmanager
+from functools import wraps
 from Clipboard import ClipboardStack
+from TextBuffer import BlockBuffer
+from UndoManager import UndoManager, EditCommand
+from MappedFile import MappedText
+from DocumentStatistics import DocumentStatistics
+from TextSearch import TextSearch
+
+#runs a model operation inside an edit transaction so that observers are
+#notified at most once per kind when the outermost operation finishes
+def editOperation(method):
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.beginEdit()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.endEdit()
+    return wrapper
 
 class TextEditorModel:
-    def __init__(self, text):
+    MAX_PENDING_CHANGES = 1000
+
+    def __init__(self, text, bufferClass=BlockBuffer, clipboard=None):
         #2.2
-        self.lines = text.split("\n")
+        self.bufferClass = bufferClass
+        self.lines = bufferClass(text.split("\n"))
+        #incremented on every change of the text
+        self.version = 0
+        self.statistics = DocumentStatistics(self.lines)
+        self.search = TextSearch(self)
+        #file whose lines are still being indexed in the background
+        self.source = None
+        #MappedText of the opened file, blocks of lines are read from it until they are edited
+        self.mapped = None
+        #line ending the text is saved with, that of the opened file
+        self.newline = "\n"
+        self.loadedLines = 0
         self.cursorLocation = Location(0, 0)
         self.selectionRange = None
+        #cursors besides the primary one, as (location, selection range or None) pairs,
+        #valid for the text version they were placed at
+        self.extraCursors = []
+        self.cursorsVersion = 0
 
         #2.4
         self.cursorObservers = []
         
         #2.5
         self.textObservers = []
+        #line changes since the last text notification, None means the whole text changed
+        self.pendingChanges = []
 
         #2.7
-        self.clipboard = ClipboardStack()
+        #several models may share one clipboard
+        self.clipboard = clipboard if clipboard is not None else ClipboardStack()
 
         #2.9
         self.selectionObservers = []
 
+        #2.11
+        self.resultObservers = []
+
+        #2.8
+        self.undoManager = UndoManager()
+
+        #EditJournal of the opened file, None when edits are not journaled
+        self.journal = None
+
+        #edit transactions
+        self.editDepth = 0
+        self.textDirty = False
+        self.cursorDirty = False
+        self.selectionDirty = False
+
+    def beginEdit(self):
+        if self.editDepth == 0:
+            self.undoManager.beginStep(self.cursorLocation)
+        self.editDepth += 1
+
+    def endEdit(self):
+        self.editDepth -= 1
+        if self.editDepth > 0:
+            return
+        self.undoManager.endStep(self.cursorLocation)
+
+        textDirty, cursorDirty, selectionDirty = self.textDirty, self.cursorDirty, self.selectionDirty
+        self.textDirty = self.cursorDirty = self.selectionDirty = False
+        if textDirty:
+            self.notifyTextObservers()
+        if cursorDirty:
+            self.notifyCursorObservers()
+        if selectionDirty:
+            self.notifySelectionObservers()
+
+    #ends the undo step of the running edit and starts the next one, so operations
+    #batched into one edit are still undone one at a time
+    def splitStep(self):
+        if self.editDepth > 0:
+            self.undoManager.endStep(self.cursorLocation)
+            self.undoManager.beginStep(self.cursorLocation)
+
+    @contextmanager
+    def edit(self):
+        self.beginEdit()
+        try:
+            yield self
+        finally:
+            self.endEdit()
+
     #2.9
     def addSelectionObserver(self, observer):
         self.selectionObservers.append(observer)
@@ -33,19 +123,101 @@ class TextEditorModel:
         self.selectionObservers.remove(observer)
 
     def notifySelectionObservers(self):
+        if self.editDepth > 0:
+            self.selectionDirty = True
+            return
         for observer in self.selectionObservers:
             observer.selectionChanged()
 
+    @editOperation
     def setText(self, text):
-        self.lines = text.split("\n")
+        old = self.getText()
+        #the same text again is no change, it is neither recorded nor does it bump the version
+        if text == old:
+            return
+        self.undoManager.record(EditCommand(Location(0, 0), old, text))
+        if self.journal is not None:
+            self.journal.recordText(text)
+        self.lines = self.bufferClass(text.split("\n"))
+        self.closeFile()
+        self.pendingChanges = None
+        self.version += 1
+        self.statistics.reset(self.lines)
         self.setSelectionRange(None)
         self.notifyTextObservers()
 
+    #opens a file without reading it into memory: the first screen of lines is indexed
+    #right away and syncLoading adds the rest as the background indexer finds them
+    @editOperation
+    def openFile(self, path, firstLines=200):
+        #the journal of the previous file must not record edits of this one
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        source = MappedText(path)
+        source.indexLines(firstLines)
+        self.closeFile()
+        self.source = self.mapped = source
+        self.newline = source.newline
+        self.loadedLines = source.completeLines()
+        self.lines = self.bufferClass.fromSource(source, self.loadedLines)
+        self.pendingChanges = None
+        self.version += 1
+        self.statistics.invalidate()
+        self.undoManager.clear()
+        self.cursorLocation = Location(0, 0)
+        self.setSelectionRange(None)
+        self.notifyCursorObservers()
+        if not source.done:
+            source.startIndexing()
+
+    #returns True while the file is still being indexed
+    @editOperation
+    def syncLoading(self):
+        if self.source is None:
+            return False
+        count = self.source.completeLines()
+        if count > self.loadedLines:
+            if self.pendingChanges is not None:
+                self.pendingChanges.append(LineChange(len(self.lines), 0, count - self.loadedLines))
+            self.lines.appendSource(self.source, self.loadedLines, count)
+            self.statistics.invalidate()
+            self.loadedLines = count
+            self.notifyTextObservers()
+        if self.source.done and self.loadedLines == self.source.completeLines():
+            self.source = None
+            return False
+        return True
+
+    #closes the opened file once no lines are read from it any more
+    def closeFile(self):
+        if self.mapped is not None:
+            self.mapped.close()
+        self.source = self.mapped = None
+
+    #indexes the rest of a file that is still loading and adds its lines, the
+    #whole text is needed for instance to save it
+    def finishLoading(self):
+        if self.source is None:
+            return
+        if self.source.thread is not None:
+            self.source.thread.join()
+        self.source.indexLines()
+        self.syncLoading()
+
     def getText(self):
         return "\n".join(self.lines)
 
+    @editOperation
     def clear(self):
-        self.lines = [""]
+        self.undoManager.record(EditCommand(Location(0, 0), self.getText(), ""))
+        if self.journal is not None:
+            self.journal.recordText("")
+        self.lines = self.bufferClass([""])
+        self.closeFile()
+        self.pendingChanges = None
+        self.version += 1
+        self.statistics.reset(self.lines)
         self.cursorLocation = Location(0, 0)
         self.setSelectionRange(None)
         self.notifyTextObservers()
@@ -58,6 +230,7 @@ class TextEditorModel:
             text = self.getTextFromRange(selected)
             self.clipboard.push(text)
 
+    @editOperation
     def cutSelection(self):
         selected = self.getSelectionRange()
         if selected:
@@ -67,6 +240,7 @@ class TextEditorModel:
             self.setSelectionRange(None)
         self.notifyCursorObservers()
 
+    @editOperation
     def paste(self):
         text = self.clipboard.peek()
         if text is not None:
@@ -75,6 +249,7 @@ class TextEditorModel:
             self.notifyCursorObservers()
             self.notifySelectionObservers()
 
+    @editOperation
     def pasteAndRemove(self):
         text = self.clipboard.pop()
         if text is not None:
@@ -93,13 +268,16 @@ class TextEditorModel:
                 return self.lines[start.y][start.x:end.x]
             else:
                 selectedText = [self.lines[start.y][start.x:]]
-                for i in range(start.y + 1, end.y):
-                    selectedText.append(self.lines[i])
+                selectedText.extend(self.lines.getLines(start.y + 1, end.y))
                 selectedText.append(self.lines[end.y][:end.x])
                 return "\n".join(selectedText)
 
     #2.6
+    @editOperation
     def insert(self, c):
+        if self.multipleCursors():
+            self.insertAtCursors("\n" if c == "\r" else c)
+            return
 
         if self.getSelectionRange() is not None:
             self.deleteRange(self.getSelectionRange())
@@ -107,16 +285,9 @@ class TextEditorModel:
         if len(c) == 1:
             #if the character is a newline character then split the line at the cursor location
             if c == "\n" or c == "\r":
-                self.lines.insert(self.cursorLocation.y + 1, self.lines[self.cursorLocation.y][self.cursorLocation.x:])
-                self.lines[self.cursorLocation.y] = self.lines[self.cursorLocation.y][:self.cursorLocation.x]
-                self.cursorLocation.y += 1
-                self.cursorLocation.x = 0
+                self.cursorLocation = self.insertAt(self.cursorLocation, "\n")
             else:  #if the character is not a newline character then insert the character at the cursor location
-                y = self.cursorLocation.y
-                x = self.cursorLocation.x
-
-                self.lines[y] = self.lines[y][:x] + c + self.lines[y][x:]
-                self.cursorLocation.x += 1
+                self.cursorLocation = self.insertAt(self.cursorLocation, c)
         else:
             self.insertText(c)
         
@@ -124,41 +295,194 @@ class TextEditorModel:
         self.notifyCursorObservers()
     
 
+    @editOperation
     def insertText(self, text):
+        if self.multipleCursors():
+            self.insertAtCursors(text)
+            return
+
         if self.selectionRange is not None:
             self.deleteRange(self.selectionRange)
             self.selectionRange = None
 
+        self.cursorLocation = self.insertAt(self.cursorLocation, text)
+        self.notifyTextObservers()
+
+    #inserts text at the location and returns the location after it
+    def insertAt(self, location, text):
+        return self.replaceRange(location, location, text)
+
+    #removes the text between two ordered locations
+    def removeRange(self, start, end):
+        self.replaceRange(start, end, "")
+
+    #replaces the text between two ordered locations and returns the location after the new text,
+    #every change of the text made by an operation goes through here and is recorded for undo
+    def replaceRange(self, start, end, text):
+        first = self.lines[start.y]
+        last = first if end.y == start.y else self.lines[end.y]
+        removed = first[start.x:end.x] if end.y == start.y else self.getTextFromRange(LocationRange(start, end))
+        self.undoManager.record(EditCommand(start, removed, text))
+        if self.journal is not None:
+            self.journal.recordRange(start, end, text)
+
         # Split the text by newline characters
         lines = text.split("\n")
 
-        # Get the current line at the cursor location
-        current_line = self.lines[self.cursorLocation.y]
-        before_cursor = current_line[:self.cursorLocation.x]
-        after_cursor = current_line[self.cursorLocation.x:]
+        # Attach the text before the start to the first new line and the text after the end to the last
+        newEnd = Location(len(lines[-1]) if len(lines) > 1 else start.x + len(lines[0]), start.y + len(lines) - 1)
+        lines[0] = first[:start.x] + lines[0]
+        lines[-1] += last[end.x:]
+
+        # Replace the lines from the start to the end with all the new lines in one splice
+        self.replaceLines(start.y, end.y + 1, lines, [first] if end.y == start.y else None)
+        return newEnd
+
+    #replaces text on many places in one edit and one undo step, the replacements
+    #are (LocationRange, text) pairs that do not overlap
+    @editOperation
+    def applyReplacements(self, replacements):
+        #replacements on neighbouring lines are joined into runs of whole lines, so that
+        #each run is a single splice of the lines and a single undo command
+        runs = []
+        run = None
+        for r, text in sorted(replacements, key=lambda replacement: (replacement[0].start.y, replacement[0].start.x)):
+            if run is not None and r.start.y > run["end"].y + 1:
+                runs.append(run)
+                run = None
+            if run is None:
+                run = {"start": Location(0, r.start.y), "end": Location(0, r.start.y), "pieces": []}
+            if run["end"].y == r.start.y:
+                run["pieces"].append(self.lines[r.start.y][run["end"].x:r.start.x])
+            else:
+                run["pieces"].append(self.getTextFromRange(LocationRange(run["end"], r.start)))
+            run["pieces"].append(text)
+            run["end"] = r.end
+        if run is not None:
+            runs.append(run)
+
+        #going from the end of the document keeps the locations of earlier runs valid
+        for run in reversed(runs):
+            end = Location(len(self.lines[run["end"].y]), run["end"].y)
+            run["pieces"].append(self.getTextFromRange(LocationRange(run["end"], end)))
+            self.replaceRange(run["start"], end, "".join(run["pieces"]))
+        y = min(self.cursorLocation.y, len(self.lines) - 1)
+        self.cursorLocation = Location(min(self.cursorLocation.x, len(self.lines[y])), y)
+        self.setSelectionRange(None)
+        self.notifyCursorObservers()
 
-        # Insert the first line at the cursor location
-        self.lines[self.cursorLocation.y] = before_cursor + lines[0]
 
-        # If there's more than one line to insert
-        if len(lines) > 1:
-            # Insert all middle lines directly
-            for i in range(1, len(lines) - 1):
-                self.cursorLocation.y += 1
-                self.lines.insert(self.cursorLocation.y, lines[i])
-            
-            # Insert the last line and attach the after_cursor part of the original line
-            self.cursorLocation.y += 1
-            self.lines.insert(self.cursorLocation.y, lines[-1] + after_cursor)
-            self.cursorLocation.x = len(lines[-1])
-        else:
-            # If there's only one line, reattach the after_cursor part
-            self.lines[self.cursorLocation.y] += after_cursor
-            self.cursorLocation.x += len(lines[0])
+    #multiple cursors
+    def getCursors(self):
+        #a text change made with a single cursor leaves the extra cursors behind, so they are dropped
+        if self.extraCursors and self.cursorsVersion != self.version:
+            self.extraCursors = []
+        return [(self.cursorLocation, self.selectionRange)] + self.extraCursors
 
-        self.notifyTextObservers()
+    def multipleCursors(self):
+        return len(self.getCursors()) > 1
+
+    @editOperation
+    def addCursor(self, location, selection=None):
+        self.getCursors()
+        self.extraCursors.append((location, selection))
+        self.cursorsVersion = self.version
+        self.notifyCursorObservers()
+        if selection is not None:
+            #the view draws selections when the text observers are notified
+            self.notifyTextObservers()
+            self.notifySelectionObservers()
+
+    #puts a cursor at the column of every line in [first, last), for column editing
+    @editOperation
+    def addCursorsToLines(self, first, last, column):
+        self.getCursors()
+        self.cursorsVersion = self.version
+        for y, line in enumerate(self.lines.getLines(first, last), first):
+            location = Location(min(column, len(line)), y)
+            if location != self.cursorLocation:
+                self.extraCursors.append((location, None))
+        self.notifyCursorObservers()
+
+    @editOperation
+    def clearCursors(self):
+        if self.extraCursors:
+            self.extraCursors = []
+            self.notifyCursorObservers()
+            self.notifySelectionObservers()
+
+    @staticmethod
+    def orderedRange(location, selection):
+        if selection is None:
+            return location, location
+        start, end = selection
+        if end.y < start.y or (end.y == start.y and end.x < start.x):
+            return end, start
+        return start, end
+
+    def rangeBefore(self, location, selection):
+        if selection is not None:
+            return self.orderedRange(location, selection)
+        if location.x > 0:
+            return Location(location.x - 1, location.y), location
+        if location.y > 0:
+            return Location(len(self.lines[location.y - 1]), location.y - 1), location
+        return location, location
+
+    def rangeAfter(self, location, selection):
+        if selection is not None:
+            return self.orderedRange(location, selection)
+        if location.x < len(self.lines[location.y]):
+            return location, Location(location.x + 1, location.y)
+        if location.y < len(self.lines) - 1:
+            return location, Location(0, location.y + 1)
+        return location, location
+
+    def insertAtCursors(self, text):
+        self.editAtCursors(self.orderedRange, text)
+
+    #replaces the range rangeOf(location, selection) of every cursor with the text in one
+    #sorted pass, so all cursors cost one edit, one notification and one undo step
+    @editOperation
+    def editAtCursors(self, rangeOf, text):
+        edits = sorted((rangeOf(location, selection) + (i,) for i, (location, selection) in enumerate(self.getCursors())),
+                       key=lambda edit: (edit[0].y, edit[0].x, edit[1].y, edit[1].x))
+
+        #overlapping ranges are joined, the cursors of a joined range end up in one place
+        merged = []
+        owners = []
+        for start, end, i in edits:
+            if merged and ((start.y, start.x) < (merged[-1][1].y, merged[-1][1].x) or (start, end) == merged[-1]):
+                if (end.y, end.x) > (merged[-1][1].y, merged[-1][1].x):
+                    merged[-1] = (merged[-1][0], end)
+                owners[-1].append(i)
+            else:
+                merged.append((start, end))
+                owners.append([i])
+
+        #where the text of each range ends once the ranges before it are replaced
+        textLines = text.split("\n")
+        newlines, tail = len(textLines) - 1, len(textLines[-1])
+        locations = [None] * len(edits)
+        shiftY, shiftLine, shiftX = 0, -1, 0
+        for (start, end), cursors in zip(merged, owners):
+            x = start.x + shiftX if start.y == shiftLine else start.x
+            after = Location(x + tail if newlines == 0 else tail, start.y + shiftY + newlines)
+            for i in cursors:
+                locations[i] = after
+            shiftY += newlines - (end.y - start.y)
+            shiftLine, shiftX = end.y, after.x - end.x
+
+        replacements = [(LocationRange(start, end), text) for start, end in merged if text or start != end]
+        if replacements:
+            self.applyReplacements(replacements)
+
+        self.cursorLocation = locations[0]
+        self.extraCursors = [(location, None) for location in dict.fromkeys(locations[1:]) if location != locations[0]]
+        self.cursorsVersion = self.version
+        self.setSelectionRange(None)
+        self.notifyCursorObservers()
 
-    
     #2.5
     def addTextObserver(self, observer: TextObserver):
         self.textObservers.append(observer)
@@ -167,10 +491,33 @@ class TextEditorModel:
         self.textObservers.remove(observer)
 
     def notifyTextObservers(self):
+        if self.editDepth > 0:
+            self.textDirty = True
+            return
+        changes = self.pendingChanges
+        self.pendingChanges = []
         for observer in self.textObservers:
-            observer.updateText()
+            observer.updateText(changes)
+
+    #every change of the lines goes through here so that observers learn which lines changed
+    def replaceLines(self, start, end, lines, oldLines=None):
+        if self.statistics.ready:
+            self.statistics.update(oldLines if oldLines is not None else self.lines.getLines(start, end), lines)
+        self.lines.replaceLines(start, end, lines)
+        self.version += 1
+        if self.pendingChanges is not None:
+            self.pendingChanges.append(LineChange(start, end - start, len(lines)))
+            #observers redraw or reindex everything faster than they replay thousands of changes
+            if len(self.pendingChanges) > self.MAX_PENDING_CHANGES:
+                self.pendingChanges = None
+        self.notifyTextObservers()
 
+    @editOperation
     def deleteBefore(self):
+        if self.multipleCursors():
+            self.editAtCursors(self.rangeBefore, "")
+            return
+
         if self.selectionRange is not None:                 #if there is a selection range then delete the selected text
             self.deleteRange(self.getSelectionRange())
             self.selectionRange = None
@@ -180,22 +527,27 @@ class TextEditorModel:
             return
         
         if self.cursorLocation.x > 0:                       #if the cursor is not at the beginning of the line
-            self.lines[self.cursorLocation.y] = self.lines[self.cursorLocation.y][:self.cursorLocation.x-1] + self.lines[self.cursorLocation.y][self.cursorLocation.x:]
-            self.cursorLocation.x -= 1
+            previous = Location(self.cursorLocation.x - 1, self.cursorLocation.y)
+            self.removeRange(previous, self.cursorLocation)
+            self.cursorLocation = previous
 
             self.notifyTextObservers()
             self.notifyCursorObservers()
             self.notifySelectionObservers()
         elif self.cursorLocation.y > 0:                     #if the cursor is at the beginning of the line
-            self.cursorLocation.y -= 1
-            self.cursorLocation.x = len(self.lines[self.cursorLocation.y])
-            self.lines[self.cursorLocation.y] += self.lines.pop(self.cursorLocation.y+1)
+            self.cursorLocation = Location(len(self.lines[self.cursorLocation.y - 1]), self.cursorLocation.y - 1)
+            self.removeRange(self.cursorLocation, Location(0, self.cursorLocation.y + 1))
             
             self.notifyTextObservers()
             self.notifyCursorObservers()
             self.notifySelectionObservers()
             
+    @editOperation
     def deleteAfter(self):
+        if self.multipleCursors():
+            self.editAtCursors(self.rangeAfter, "")
+            return
+
         if self.selectionRange is not None:
             self.deleteRange(self.getSelectionRange())
             self.selectionRange = None
@@ -205,113 +557,129 @@ class TextEditorModel:
             return
         
         if self.cursorLocation.x < len(self.lines[self.cursorLocation.y]):              #if the cursor is not at the end of the line
-            self.lines[self.cursorLocation.y] = self.lines[self.cursorLocation.y][:self.cursorLocation.x] + self.lines[self.cursorLocation.y][self.cursorLocation.x+1:]
+            self.removeRange(self.cursorLocation, Location(self.cursorLocation.x + 1, self.cursorLocation.y))
             
             self.notifyTextObservers()
             self.notifyCursorObservers()
             self.notifySelectionObservers()
         elif self.cursorLocation.y < len(self.lines) - 1:                               #if the cursor is at the end of the line
-            self.lines[self.cursorLocation.y] += self.lines.pop(self.cursorLocation.y+1)
+            self.removeRange(self.cursorLocation, Location(0, self.cursorLocation.y + 1))
             
             self.notifyTextObservers()
             self.notifyCursorObservers()
             self.notifySelectionObservers()
 
+    @editOperation
     def deleteRange(self, r: LocationRange):
         # Ensure start is before end
         start, end = (r.start, r.end) if (r.start.y < r.end.y or (r.start.y == r.end.y and r.start.x <= r.end.x)) else (r.end, r.start)
 
-        if start.y == end.y:
-            # Same line
-            self.lines[start.y] = self.lines[start.y][:start.x] + self.lines[end.y][end.x:]
-        else:
-            # Different lines
-            self.lines[start.y] = self.lines[start.y][:start.x] + self.lines[end.y][end.x:]
-            del self.lines[start.y + 1:end.y + 1]
+        self.removeRange(start, end)
 
-        self.cursorLocation = deepcopy(start)
+        self.cursorLocation = start
         self.setSelectionRange(None)
         self.notifyCursorObservers()
         self.notifySelectionObservers()
 
+    #2.8
+    @editOperation
+    def undo(self):
+        step = self.undoManager.popUndo()
+        if step is None:
+            return
+        self.replayCommands([(command.location, command.inserted, command.removed) for command in reversed(step.commands)])
+        self.cursorLocation = step.cursorBefore
+        self.setSelectionRange(None)
+        self.notifyCursorObservers()
+
+    @editOperation
+    def redo(self):
+        step = self.undoManager.popRedo()
+        if step is None:
+            return
+        self.replayCommands([(command.location, command.removed, command.inserted) for command in step.commands])
+        self.cursorLocation = step.cursorAfter
+        self.setSelectionRange(None)
+        self.notifyCursorObservers()
+
+    #replaces the text old at each location with new, without recording it again
+    def replayCommands(self, commands):
+        self.undoManager.recording = False
+        try:
+            for location, old, new in commands:
+                lines = old.split("\n")
+                end = Location(len(lines[-1]) if len(lines) > 1 else location.x + len(old), location.y + len(lines) - 1)
+                self.replaceRange(location, end, new)
+        finally:
+            self.undoManager.recording = True
+
     def getSelectionRange(self):
         return self.selectionRange
 
+    @editOperation
     def setSelectionRange(self, r: LocationRange):
         self.selectionRange = r
         self.notifyTextObservers()
         self.notifySelectionObservers()
 
+    #moves the cursor to the location and extends the selection to it
+    def extendSelection(self, location):
+        anchor = self.cursorLocation if self.selectionRange is None else self.selectionRange.start
+        self.cursorLocation = location
+        self.setSelectionRange(LocationRange(anchor, location))
+        self.notifyCursorObservers()
+
+    @editOperation
     def selectionRangeLeft(self):
+        x, y = self.cursorLocation
         #this is the case when the cursor is at the beginning of the first line
-        if self.cursorLocation.x <= 0 and self.cursorLocation.y == 0:
+        if x <= 0 and y == 0:
             return
-        
-        #this is the case when the selection range is None
-        if self.getSelectionRange() is None:
-            self.setSelectionRange(LocationRange(deepcopy(self.cursorLocation), deepcopy(self.cursorLocation)))
-        
-        #this is the case when the cursor is not at the beginning of the line
-        if self.cursorLocation.x > 0:
-            self.cursorLocation.x -= 1
-        else:   #this is the case when the cursor is at the beginning of the line
-            if self.cursorLocation.y > 0:
-                self.cursorLocation.y -= 1
-                self.cursorLocation.x = len(self.lines[self.cursorLocation.y])
-
-        self.getSelectionRange().end= deepcopy(self.cursorLocation)
-        self.notifyTextObservers()
-        self.notifyCursorObservers()
-        self.notifySelectionObservers()
 
+        if x > 0:       #this is the case when the cursor is not at the beginning of the line
+            self.extendSelection(Location(x - 1, y))
+        else:           #this is the case when the cursor is at the beginning of the line
+            self.extendSelection(Location(len(self.lines[y - 1]), y - 1))
+
+    @editOperation
     def selectionRangeRight(self):
+        x, y = self.cursorLocation
         #this is the case when the cursor is at the end of the last line
-        if self.cursorLocation.x >= len(self.lines[self.cursorLocation.y]) and self.cursorLocation.y == len(self.lines) - 1:
+        if x >= len(self.lines[y]) and y == len(self.lines) - 1:
             return
 
-        #this is the case when the selection range is None
-        if self.getSelectionRange() is None:
-            self.setSelectionRange(LocationRange(deepcopy(self.cursorLocation), deepcopy(self.cursorLocation)))
-
-        #this is the case when the cursor is not at the end of the line
-        if self.cursorLocation.x < len(self.lines[self.cursorLocation.y]):
-            self.cursorLocation.x += 1
-        else:   #this is the case when the cursor is at the end of the line
-            if self.cursorLocation.y < len(self.lines) - 1:
-                self.cursorLocation.y += 1
-                self.cursorLocation.x = 0
-
-        #this is the case when the cursor is at the end of the last line
-        self.getSelectionRange().end = deepcopy(self.cursorLocation)
-        self.notifyTextObservers()
-        self.notifyCursorObservers()
-        self.notifySelectionObservers()
+        if x < len(self.lines[y]):  #this is the case when the cursor is not at the end of the line
+            self.extendSelection(Location(x + 1, y))
+        else:                       #this is the case when the cursor is at the end of the line
+            self.extendSelection(Location(0, y + 1))
 
+    @editOperation
     def selectionRangeUp(self):
-        if self.getSelectionRange() is None:
-            self.setSelectionRange(LocationRange(deepcopy(self.cursorLocation), deepcopy(self.cursorLocation)))
-
-        if self.cursorLocation.y > 0:
-            self.cursorLocation.y -= 1
-            self.cursorLocation.x = min(self.cursorLocation.x, len(self.lines[self.cursorLocation.y]))
-
-        self.getSelectionRange().end = deepcopy(self.cursorLocation)
-        self.notifyTextObservers()
-        self.notifyCursorObservers()
-        self.notifySelectionObservers()
+        x, y = self.cursorLocation
+        if y > 0:
+            y -= 1
+            x = min(x, len(self.lines[y]))
+        self.extendSelection(Location(x, y))
 
+    @editOperation
     def selectionRangeDown(self):
-        if self.getSelectionRange() is None:
-            self.setSelectionRange(LocationRange(deepcopy(self.cursorLocation), deepcopy(self.cursorLocation)))
+        x, y = self.cursorLocation
+        if y < len(self.lines) - 1:
+            y += 1
+            x = min(x, len(self.lines[y]))
+        self.extendSelection(Location(x, y))
 
-        if self.cursorLocation.y < len(self.lines) - 1:
-            self.cursorLocation.y += 1
-            self.cursorLocation.x = min(self.cursorLocation.x, len(self.lines[self.cursorLocation.y]))
+    #2.11
+    def addResultObserver(self, observer: ResultObserver):
+        self.resultObservers.append(observer)
 
-        self.getSelectionRange().end = deepcopy(self.cursorLocation)
-        self.notifyTextObservers()
-        self.notifyCursorObservers()
-        self.notifySelectionObservers()
+    def removeResultObserver(self, observer: ResultObserver):
+        self.resultObservers.remove(observer)
+
+    #plugins report what they did here, data is an optional dict of values for tools
+    def reportResult(self, title, message, data=None):
+        for observer in self.resultObservers:
+            observer.pluginResult(title, message, data)
 
     #2.4
     def addCursorObserver(self, observer: CursorObserver):
@@ -321,55 +689,65 @@ class TextEditorModel:
         self.cursorObservers.remove(observer)
 
     def notifyCursorObservers(self):
+        if self.editDepth > 0:
+            self.cursorDirty = True
+            return
         for observer in self.cursorObservers:
             #print(observer.__class__.__name__)
             observer.updateCursorLocation(self.cursorLocation)
 
-    def moveCursorLeft(self):
-        if self.cursorLocation.x > 0:           #if the cursor is not at the beginning of the line
-            self.cursorLocation.x -= 1
-
-            self.setSelectionRange(None)
-            self.notifyCursorObservers()
-            
-        else:                                   #if the cursor is at the beginning of the line
-            if self.cursorLocation.y > 0:       #if the cursor is not at the beginning of the first line
-                self.cursorLocation.y -= 1
-                self.cursorLocation.x = len(self.lines[self.cursorLocation.y])
+    #moves the cursor to the location and drops the selection
+    def moveCursor(self, location):
+        self.cursorLocation = location
+        self.extraCursors = []
+        self.setSelectionRange(None)
+        self.notifyCursorObservers()
 
-                self.setSelectionRange(None)
-                self.notifyCursorObservers()
+    @editOperation
+    def moveCursorLeft(self):
+        x, y = self.cursorLocation
+        if x > 0:           #if the cursor is not at the beginning of the line
+            self.moveCursor(Location(x - 1, y))
+        elif y > 0:         #if the cursor is at the beginning of the line but not of the first line
+            self.moveCursor(Location(len(self.lines[y - 1]), y - 1))
 
+    @editOperation
     def moveCursorRight(self):
-        if self.cursorLocation.x < len(self.lines[self.cursorLocation.y]):    #if the cursor is not at the end of the line
-            self.cursorLocation.x += 1
+        x, y = self.cursorLocation
+        if x < len(self.lines[y]):          #if the cursor is not at the end of the line
+            self.moveCursor(Location(x + 1, y))
+        elif y < len(self.lines) - 1:       #if the cursor is at the end of the line but not of the last line
+            self.moveCursor(Location(0, y + 1))
 
-            self.setSelectionRange(None)
-            self.notifyCursorObservers()
-        elif self.cursorLocation.y == len(self.lines) - 1:                      #if the cursor is at the end of the last line
-            pass
-        else:                                                                   #if the cursor is at the end of the line
-            self.cursorLocation.x = 0
-            self.cursorLocation.y += 1
+    @editOperation
+    def moveCursorUp(self):
+        x, y = self.cursorLocation
+        if y > 0:
+            self.moveCursor(Location(min(x, len(self.lines[y - 1])), y - 1))
 
-            self.setSelectionRange(None)
-            self.notifyCursorObservers()
+    @editOperation
+    def moveCursorDown(self):
+        x, y = self.cursorLocation
+        if y < len(self.lines) - 1:
+            self.moveCursor(Location(min(x, len(self.lines[y + 1])), y + 1))
 
-    def moveCursorUp(self):
-        if self.cursorLocation.y > 0:
-            self.cursorLocation.y -= 1
-            self.cursorLocation.x = min(self.cursorLocation.x, len(self.lines[self.cursorLocation.y]))
+    #character offsets count one character for every newline, like getText()
+    def locationToOffset(self, location: Location):
+        return self.lines.lineOffset(location.y) + location.x
 
-            self.setSelectionRange(None)
-            self.notifyCursorObservers()
+    def offsetToLocation(self, offset):
+        y, x = self.lines.offsetLine(offset)
+        return Location(x, y)
 
-    def moveCursorDown(self):
-        if self.cursorLocation.y < len(self.lines) - 1:
-            self.cursorLocation.y += 1
-            self.cursorLocation.x = min(self.cursorLocation.x, len(self.lines[self.cursorLocation.y]))
+    def lineCount(self):
+        return len(self.lines)
 
-            self.setSelectionRange(None)
-            self.notifyCursorObservers()
+    def charCount(self):
+        return self.lines.charCount()
+
+    #returns (lines, words, characters)
+    def getStatistics(self):
+        return self.statistics.counts(self.lines)
 
     #2.3
     def allLines(self):